@@ -1,108 +1,246 @@
 # agents.py
-import ollama
+import os
 from datetime import datetime, timedelta
-from database import get_session, FitnessLog, NutritionLog
+from database import get_session, User, WorkoutPlan, NutritionPlan
+from llm_backend import OllamaBackend
+from queries import window_start, latest_plan
+from log_cache import recent_logs
 
-class FitnessCoachAgent:
-    def analyze_fitness_data(self, user_id, session):
+# A plan is updated from the logs added since the previous plan, with the model
+# only writing the adjustments, while that plan is recent and hasn't been updated
+# too often. Otherwise it is regenerated from the full 7-day window.
+# HEALTH_COACH_INCREMENTAL_MAX_AGE_DAYS=0 always regenerates.
+INCREMENTAL_MAX_AGE = timedelta(days=float(os.environ.get('HEALTH_COACH_INCREMENTAL_MAX_AGE_DAYS', '7')))
+MAX_PLAN_UPDATES = 3
+UPDATE_HEADING = '#### Update'
+# Words of the original plan quoted in an update prompt
+PLAN_DIGEST_WORDS = 60
+
+class _Agent:
+    plan_model = None
+    error_prefix = None
+
+    def __init__(self, backend=None):
+        self.backend = backend or OllamaBackend()
+
+    def previous_plan(self, user_id, session):
+        # The user's last plan if it can be updated rather than regenerated
+        if self.plan_model is None or INCREMENTAL_MAX_AGE <= timedelta(0):
+            return None
+        plan = latest_plan(session, self.plan_model, user_id)
+        if plan is None or plan.generated_at is None:
+            return None
+        if datetime.utcnow() - plan.generated_at > INCREMENTAL_MAX_AGE:
+            return None
+        if self.error_prefix in plan.plan_content or plan.plan_content.count(UPDATE_HEADING) >= MAX_PLAN_UPDATES:
+            return None
+        return plan
+
+    def prepare(self, user_id, session, incremental=True):
+        # (prompt, prefix): the model's reply is appended to prefix to form the plan
+        previous = self.previous_plan(user_id, session) if incremental else None
+        if previous is None:
+            return self.build_prompt(user_id, session), ''
+        prefix = f"{previous.plan_content}\n\n{UPDATE_HEADING} {datetime.utcnow():%Y-%m-%d}\n\n"
+        return self.build_update_prompt(user_id, session, previous), prefix
+
+    def plan_digest(self, plan_content):
+        # What an update prompt quotes of the previous plan: the start of the
+        # original and only its latest update, so the prompt stays short however
+        # long the plan has grown
+        original, *updates = plan_content.split(UPDATE_HEADING)
+        words = original.split()
+        digest = ' '.join(words[:PLAN_DIGEST_WORDS]) + (' ...' if len(words) > PLAN_DIGEST_WORDS else '')
+        if updates:
+            date, _, changes = updates[-1].strip().partition('\n')
+            digest += f"\n\nLatest update ({date.strip()}): {' '.join(changes.split())}"
+        return digest
+
+    def _generate(self, user_id, session):
+        prompt, prefix = self.prepare(user_id, session)
+        try:
+            return prefix + self.backend.chat(self.model, self.system_prompt, prompt, task=self.task)
+        except Exception as e:
+            return self.error_text(e)
+
+    def _stream(self, user_id, session):
+        prompt, prefix = self.prepare(user_id, session)
+        if prefix:
+            yield prefix
+        try:
+            yield from self.backend.stream_chat(self.model, self.system_prompt, prompt, task=self.task)
+        except Exception as e:
+            yield self.error_text(e)
+
+class FitnessCoachAgent(_Agent):
+    task = 'workout_plan'
+    model = None  # chosen per task by the backend's router
+    plan_model = WorkoutPlan
+    error_prefix = "Error generating fitness analysis"
+    system_prompt = "You are a professional fitness coach. Provide concise, actionable advice with specific recommendations."
+
+    def build_prompt(self, user_id, session):
         # Get last 7 days of fitness data
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=7)
-        
-        logs = session.query(FitnessLog).filter(
-            FitnessLog.user_id == user_id,
-            FitnessLog.created_at >= start_date
-        ).all()
-        
-        total_duration = sum(log.duration for log in logs) if logs else 0
-        total_calories = sum(log.calories_burned for log in logs) if logs else 0
-        activities = [log.activity_type for log in logs]
-        
-        prompt = f"""
+        start_date = window_start(7)
+
+        summary = recent_logs.fitness_summary(session, user_id, start_date)
+        return self.format_prompt(user_id, summary, recent_logs.fitness_activity_counts(session, user_id, start_date))
+
+    def format_prompt(self, user_id, summary, activity_counts):
+        activities = [f"{activity} ({count})" for activity, count in activity_counts]
+
+        return f"""
         Analyze this fitness data for user {user_id}:
-        - Total exercise duration last 7 days: {total_duration} minutes
-        - Total calories burned: {total_calories}
+        - Total exercise duration last 7 days: {summary['total_duration']} minutes
+        - Total calories burned: {summary['total_calories']}
         - Activities: {', '.join(activities) if activities else 'None'}
-        
+
         Provide a brief analysis and recommendation for the next week's workout plan.
         Focus on progressive overload and variety. Be specific with exercise types, duration, and frequency.
         """
-        
-        try:
-            response = ollama.chat(
-                model='llama3',
-                messages=[
-                    {"role": "system", "content": "You are a professional fitness coach. Provide concise, actionable advice with specific recommendations."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            return response['message']['content']
-        except Exception as e:
-            return f"Error generating fitness analysis: {str(e)}. Please ensure Ollama is running and the llama3 model is installed."
 
-class NutritionCoachAgent:
-    def analyze_nutrition_data(self, user_id, session):
+    def build_update_prompt(self, user_id, session, previous):
+        delta = recent_logs.fitness_since(session, user_id, previous.generated_at)
+        activities = [f"{activity} ({count})" for activity, count in delta['activities']]
+
+        return f"""
+        The current workout plan for user {user_id}, written {previous.generated_at:%Y-%m-%d %H:%M} UTC, in short:
+
+        {self.plan_digest(previous.plan_content)}
+
+        Logged since then:
+        - Sessions: {delta['sessions']}, {delta['total_duration']} minutes in total
+        - Calories burned: {delta['total_calories']}
+        - Activities: {', '.join(activities) if activities else 'None'}
+
+        Reply only with the adjustments this new activity calls for, in at most 3 short bullet points.
+        If the plan still fits, say so in one sentence.
+        """
+
+    def error_text(self, e):
+        return f"{self.error_prefix}: {str(e)}. Please ensure Ollama is running and the llama3 model is installed."
+
+    def analyze_fitness_data(self, user_id, session):
+        return self._generate(user_id, session)
+
+    def stream_fitness_data(self, user_id, session):
+        yield from self._stream(user_id, session)
+
+class NutritionCoachAgent(_Agent):
+    task = 'nutrition_plan'
+    model = None  # chosen per task by the backend's router
+    plan_model = NutritionPlan
+    error_prefix = "Error generating nutrition analysis"
+    system_prompt = "You are a professional nutritionist. Provide concise, actionable advice with specific food and meal recommendations."
+
+    def build_prompt(self, user_id, session):
         # Get last 7 days of nutrition data
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=7)
-        
-        logs = session.query(NutritionLog).filter(
-            NutritionLog.user_id == user_id,
-            NutritionLog.created_at >= start_date
-        ).all()
-        
-        total_calories = sum(log.calories for log in logs) if logs else 0
-        avg_daily_calories = total_calories / 7 if logs else 0
-        avg_protein = sum(log.protein for log in logs) / 7 if logs else 0
-        avg_carbs = sum(log.carbs for log in logs) / 7 if logs else 0
-        avg_fats = sum(log.fats for log in logs) / 7 if logs else 0
-        
+        start_date = window_start(7)
+
+        summary = recent_logs.nutrition_summary(session, user_id, start_date)
+
         # Get user info for context
         user = session.query(User).filter(User.id == user_id).first()
+        return self.format_prompt(user_id, summary, user)
+
+    def format_prompt(self, user_id, summary, user):
+        avg_daily_calories = summary['total_calories'] / 7
+        avg_protein = summary['total_protein'] / 7
+        avg_carbs = summary['total_carbs'] / 7
+        avg_fats = summary['total_fats'] / 7
+
         user_info = f"Age: {user.age}, Weight: {user.weight}kg, Height: {user.height}cm, Goal: {user.fitness_goal}" if user else ""
-        
-        prompt = f"""
+
+        return f"""
         Analyze this nutrition data for user {user_id} ({user_info}):
         - Average daily calories: {avg_daily_calories:.2f}
         - Average daily protein: {avg_protein:.2f}g
         - Average daily carbs: {avg_carbs:.2f}g
         - Average daily fats: {avg_fats:.2f}g
-        
+
         Provide a brief analysis and specific recommendations for a balanced nutrition plan.
         Consider macronutrient balance, meal timing, and food suggestions.
         """
-        
-        try:
-            response = ollama.chat(
-                model='llama3',
-                messages=[
-                    {"role": "system", "content": "You are a professional nutritionist. Provide concise, actionable advice with specific food and meal recommendations."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            return response['message']['content']
-        except Exception as e:
-            return f"Error generating nutrition analysis: {str(e)}. Please ensure Ollama is running and the llama3 model is installed."
 
-class MotivationalAgent:
-    def generate_motivational_text(self, user_id, fitness_goal, user_data=None):
+    def build_update_prompt(self, user_id, session, previous):
+        delta = recent_logs.nutrition_since(session, user_id, previous.generated_at)
+        days = max(1.0, (datetime.utcnow() - previous.generated_at).total_seconds() / 86400)
+
+        return f"""
+        The current nutrition plan for user {user_id}, written {previous.generated_at:%Y-%m-%d %H:%M} UTC, in short:
+
+        {self.plan_digest(previous.plan_content)}
+
+        Logged since then ({delta['meals']} meals, per-day averages):
+        - Calories: {delta['total_calories'] / days:.2f}
+        - Protein: {delta['total_protein'] / days:.2f}g
+        - Carbs: {delta['total_carbs'] / days:.2f}g
+        - Fats: {delta['total_fats'] / days:.2f}g
+
+        Reply only with the adjustments this new intake calls for, in at most 3 short bullet points.
+        If the plan still fits, say so in one sentence.
+        """
+
+    def error_text(self, e):
+        return f"{self.error_prefix}: {str(e)}. Please ensure Ollama is running and the llama3 model is installed."
+
+    def analyze_nutrition_data(self, user_id, session):
+        return self._generate(user_id, session)
+
+    def stream_nutrition_data(self, user_id, session):
+        yield from self._stream(user_id, session)
+
+class MotivationalAgent(_Agent):
+    task = 'motivation'
+    model = None  # chosen per task by the backend's router
+    system_prompt = "You are an enthusiastic motivational coach. Create inspiring, concise messages that encourage action."
+
+    def build_prompt(self, fitness_goal, user_data=None):
         user_context = ""
         if user_data:
             user_context = f"User profile: {user_data.age} years old, {user_data.weight}kg, {user_data.height}cm. "
-        
-        prompt = f"""
+
+        return f"""
         {user_context}Generate a short, motivational message for a user with this fitness goal: {fitness_goal}.
         Make it encouraging, personalized, and actionable. Keep it under 2 sentences.
         """
-        
+
+    def build_pool_prompt(self, fitness_goal, age_band, bmi_band, theme):
+        # Profile bands rather than exact values, so the message suits everyone in the pool bucket
+        return f"""
+        User profile: {age_band} years old, {bmi_band}. Generate a short, motivational message for a user with this fitness goal: {fitness_goal}.
+        Focus on {theme}. Make it encouraging and actionable. Keep it under 2 sentences.
+        """
+
+    def error_text(self, e, fitness_goal):
+        return f"Stay motivated and keep working towards your goal: {fitness_goal}! Error: {str(e)}"
+
+    def generate_motivational_text(self, user_id, fitness_goal, user_data=None):
+        prompt = self.build_prompt(fitness_goal, user_data)
+
         try:
-            response = ollama.chat(
-                model='llama3',
-                messages=[
-                    {"role": "system", "content": "You are an enthusiastic motivational coach. Create inspiring, concise messages that encourage action."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            return response['message']['content']
+            return self.backend.chat(self.model, self.system_prompt, prompt, task=self.task)
         except Exception as e:
-            return f"Stay motivated and keep working towards your goal: {fitness_goal}! Error: {str(e)}"
\ No newline at end of file
+            return self.error_text(e, fitness_goal)
+
+def generate_all(user_id, session, fitness_agent, nutrition_agent, motivational_agent):
+    # Fire the three generations concurrently, so the whole batch takes as long
+    # as the slowest call rather than the sum of all three
+    user = session.query(User).filter(User.id == user_id).first()
+    fitness_goal = user.fitness_goal if user else None
+
+    fitness_prompt, fitness_prefix = fitness_agent.prepare(user_id, session)
+    nutrition_prompt, nutrition_prefix = nutrition_agent.prepare(user_id, session)
+
+    results = fitness_agent.backend.chat_many([
+        (fitness_agent.model, fitness_agent.system_prompt, fitness_prompt, fitness_agent.task),
+        (nutrition_agent.model, nutrition_agent.system_prompt, nutrition_prompt, nutrition_agent.task),
+        (motivational_agent.model, motivational_agent.system_prompt, motivational_agent.build_prompt(fitness_goal, user), motivational_agent.task)
+    ])
+    workout, nutrition, motivation = results
+
+    return {
+        'workout_plan': fitness_agent.error_text(workout) if isinstance(workout, Exception) else fitness_prefix + workout,
+        'nutrition_plan': nutrition_agent.error_text(nutrition) if isinstance(nutrition, Exception) else nutrition_prefix + nutrition,
+        'motivation': motivational_agent.error_text(motivation, fitness_goal) if isinstance(motivation, Exception) else motivation
+    }
\ No newline at end of file
@@ -0,0 +1,103 @@
+# analytics.py
+# Monthly and yearly trends over a user's whole history. Archived months are
+# read from the Parquet partitions written by archive.py (memory-mapped, only
+# the needed columns); months still in SQLite come from the daily rollups.
+import os
+from sqlalchemy import func
+from archive import ARCHIVE_DIR, load_manifest, partitions
+from database import DailyFitnessRollup, DailyNutritionRollup
+
+# Summed per period; 'days' counts days with at least one entry
+TREND_COLUMNS = {
+    'fitness': ('sessions', 'days', 'duration', 'calories_burned'),
+    'nutrition': ('meals', 'days', 'calories', 'protein', 'carbs', 'fats')
+}
+_ROLLUPS = {
+    'fitness': (DailyFitnessRollup, {'sessions': 'sessions', 'duration': 'duration', 'calories_burned': 'calories_burned'}),
+    'nutrition': (DailyNutritionRollup, {'meals': 'meals', 'calories': 'calories', 'protein': 'protein',
+                                         'carbs': 'carbs', 'fats': 'fats'})
+}
+
+_manifest_cache = {}
+
+def _manifest_mtime(archive_dir):
+    path = os.path.join(archive_dir, 'manifest.json')
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+def _manifest(archive_dir):
+    # Reloaded only when archive.py has rewritten it
+    mtime = _manifest_mtime(archive_dir)
+    cached = _manifest_cache.get(archive_dir)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, load_manifest(archive_dir))
+        _manifest_cache[archive_dir] = cached
+    return cached[1]
+
+def _archived_months(kind, user_id, columns, archive_dir):
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    count_column = columns[0]
+    value_columns = [name for name in columns if name not in (count_column, 'days')]
+    months = {}
+    for entry in partitions(kind, user_id, manifest=_manifest(archive_dir)):
+        table = pq.read_table(os.path.join(archive_dir, entry['path']),
+                              columns=['created_at', *value_columns], memory_map=True)
+        totals = {name: pc.sum(table[name]).as_py() or 0 for name in value_columns}
+        totals[count_column] = table.num_rows
+        totals['days'] = pc.count_distinct(pc.floor_temporal(table['created_at'], unit='day')).as_py()
+        months[entry['month']] = totals
+    return months
+
+def _hot_months(session, kind, user_id, columns):
+    model, column_map = _ROLLUPS[kind]
+    rows = session.query(model.day, *(getattr(model, column_map[name]) for name in columns if name != 'days')).filter(
+        model.user_id == user_id
+    ).all()
+
+    months = {}
+    value_columns = [name for name in columns if name != 'days']
+    for day, *values in rows:
+        totals = months.setdefault(day.strftime('%Y-%m'), dict.fromkeys(columns, 0))
+        totals['days'] += 1
+        for name, value in zip(value_columns, values):
+            totals[name] += value or 0
+    return months
+
+def monthly_trends(session, kind, user_id, archive_dir=None):
+    # {'period': ['2023-01', ...], column: [...]} over archived and current months
+    archive_dir = archive_dir or ARCHIVE_DIR
+    columns = TREND_COLUMNS[kind]
+    months = _archived_months(kind, user_id, columns, archive_dir)
+    # Logs imported after archival may land in archived months, so totals are added up
+    for month, totals in _hot_months(session, kind, user_id, columns).items():
+        if month in months:
+            months[month] = {name: months[month][name] + totals[name] for name in columns}
+        else:
+            months[month] = totals
+
+    periods = sorted(months)
+    return {'period': periods, **{name: [months[period][name] for period in periods] for name in columns}}
+
+def yearly_trends(session, kind, user_id, archive_dir=None):
+    monthly = monthly_trends(session, kind, user_id, archive_dir)
+    columns = TREND_COLUMNS[kind]
+    years = {}
+    for index, month in enumerate(monthly['period']):
+        totals = years.setdefault(month[:4], dict.fromkeys(columns, 0))
+        for name in columns:
+            totals[name] += monthly[name][index]
+
+    periods = sorted(years)
+    return {'period': periods, **{name: [years[period][name] for period in periods] for name in columns}}
+
+def trends_version(session, user_id, archive_dir=None):
+    # Changes whenever the trends can: the archive was rewritten or the user's
+    # rollups changed. Two aggregate queries, for use as a chart cache key.
+    fitness = session.query(
+        func.count(DailyFitnessRollup.day), func.sum(DailyFitnessRollup.sessions), func.sum(DailyFitnessRollup.duration)
+    ).filter(DailyFitnessRollup.user_id == user_id).one()
+    nutrition = session.query(
+        func.count(DailyNutritionRollup.day), func.sum(DailyNutritionRollup.meals), func.sum(DailyNutritionRollup.calories)
+    ).filter(DailyNutritionRollup.user_id == user_id).one()
+    return (_manifest_mtime(archive_dir or ARCHIVE_DIR), tuple(fitness), tuple(nutrition))
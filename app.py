@@ -1,325 +1,565 @@
 # app.py
+import functools
+import os
 import streamlit as st
-import pandas as pd
 from datetime import datetime, timedelta
-from database import init_db, get_session, User, FitnessLog, NutritionLog, WorkoutPlan, NutritionPlan, MotivationalText
+from database import init_db, get_scoped_session, session_scope, User, FitnessLog, NutritionLog, WorkoutPlan, NutritionPlan, MotivationalText
 from agents import FitnessCoachAgent, NutritionCoachAgent, MotivationalAgent
-from utils import create_fitness_chart, create_nutrition_chart, create_macronutrient_chart
+from llm_cache import ResponseCache
+from llm_backend import OllamaBackend
+from routing import Router
+from jobs import JobQueue, ACTIVE_STATUSES
+from motivation_pool import MotivationPool
+from rollups import record_fitness_log, record_nutrition_log, ensure_rollups
+from instrumentation import metrics, install as install_instrumentation
+from queries import window_start, history_page, latest_plan
+from log_cache import recent_logs
+from utils import create_fitness_chart, create_nutrition_chart, create_macronutrient_chart, create_trend_chart
+from analytics import monthly_trends, yearly_trends, trends_version
+from food_db import load_food_index
 
-# Initialize database
+# Time every ORM query issued by the app and the agents
+install_instrumentation()
+
+# Initialize database: the engine is cached for the whole process and each
+# script run works in its own thread-scoped session
 engine = init_db()
-session = get_session(engine)
+Session = get_scoped_session(engine)
+
+@st.cache_resource(show_spinner=False)
+def get_response_cache():
+    return ResponseCache(init_db())
+
+@st.cache_resource(show_spinner=False)
+def backfill_rollups():
+    with session_scope(engine) as backfill_session:
+        return ensure_rollups(backfill_session)
+
+@st.cache_resource(show_spinner=False)
+def get_router():
+    # Ollama endpoints and per-task models, see routing.py for the configuration
+    router = Router.from_config()
+    router.start_health_checks()
+    return router
+
+@st.cache_resource(show_spinner=False)
+def get_job_queue():
+    # AI agents share one pooled Ollama backend and run on a process-wide
+    # worker pool so generations survive reruns. The backend caps the model
+    # requests in flight at HEALTH_COACH_LLM_WORKERS, whichever jobs (or the
+    # motivation pool) they come from.
+    max_requests = int(os.environ.get("HEALTH_COACH_LLM_WORKERS", "2"))
+    backend = OllamaBackend(cache=get_response_cache(), router=get_router(), max_concurrent=max_requests)
+    queue = JobQueue(
+        init_db(),
+        FitnessCoachAgent(backend),
+        NutritionCoachAgent(backend),
+        MotivationalAgent(backend),
+        max_workers=max_requests,
+        light_workers=int(os.environ.get("HEALTH_COACH_LLM_LIGHT_WORKERS", "1"))
+    )
+    queue.recover()
+    return queue
+
+@st.cache_resource(show_spinner=False)
+def get_motivation_pool():
+    # Pre-generated motivational messages, refilled in the background
+    return MotivationPool(init_db(), get_job_queue().motivational_agent).start()
 
-# Initialize AI agents
-fitness_agent = FitnessCoachAgent()
-nutrition_agent = NutritionCoachAgent()
-motivational_agent = MotivationalAgent()
+@st.cache_resource(show_spinner=False)
+def get_food_index():
+    # Compiled from the food CSV once, then memory-mapped; see food_db.py
+    return load_food_index()
+
+# Seconds between progress checks of a job that hasn't finished
+JOB_POLL_INTERVAL = 0.5
+
+def show_job(job_key, label):
+    job_id = st.session_state.get(job_key)
+    if job_id is None:
+        return
+    job = job_queue.status(job_id)
+    if job is None:
+        return
+
+    if job['status'] in ACTIVE_STATUSES:
+        poll_job(job_id, label)
+    elif job['status'] == 'done':
+        if job['kind'] == 'motivation':
+            st.info(job['result'])
+        else:
+            st.success(f"{label} generated!")
+            st.write(job['result'])
+    else:
+        st.error(f"{label} failed: {job['error']}")
+
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def poll_job(job_id, label):
+    # Only rendered while the job is pending or running; once it finishes the
+    # page reruns, show_job renders the result and the polling stops
+    job = job_queue.status(job_id)
+    if job is None or job['status'] not in ACTIVE_STATUSES:
+        st.rerun()
+    st.caption(f"{label}: {job['status']}...")
+    if job['result']:
+        st.write(job['result'])
+
+def show_history_page(session, model, user_id, render_row, empty_message, page_size, start_date, end_date):
+    # Only one page is rendered at a time; the stack of keyset cursors lets the
+    # user step back to newer pages. It resets whenever the view or filters change.
+    state_key = f"history_{model.__tablename__}_{user_id}_{page_size}_{start_date}_{end_date}"
+    cursors = st.session_state.setdefault(state_key, [None])
+    
+    rows, next_cursor = history_page(session, model, user_id, page_size, cursors[-1], start_date, end_date)
+    if not rows:
+        st.info(empty_message)
+        return
+    
+    for row in rows:
+        render_row(row)
+        st.divider()
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if len(cursors) > 1 and st.button("Newer", key=f"{state_key}_newer"):
+            cursors.pop()
+            st.rerun()
+    with col2:
+        st.caption(f"Page {len(cursors)}")
+    with col3:
+        if next_cursor is not None and st.button("Load more", key=f"{state_key}_more"):
+            cursors.append(next_cursor)
+            st.rerun()
+
+def show_diagnostics():
+    # The tables are only built when asked for, so they don't add to every rerun
+    if not st.sidebar.toggle("Show diagnostics", key="show_diagnostics"):
+        return
+    with st.sidebar.container(border=True):
+        summary = metrics.summary()
+        for title, key in (
+            ("Page renders", "renders"),
+            ("Database queries", "queries"),
+            ("AI requests (total)", "llm"),
+            ("AI requests (first token)", "llm_first_token")
+        ):
+            st.caption(title)
+            if summary[key]:
+                st.dataframe(
+                    [{"name": name, **stats} for name, stats in summary[key].items()],
+                    hide_index=True,
+                    use_container_width=True
+                )
+            else:
+                st.write("No data yet.")
+        if summary["recent_llm_calls"]:
+            st.caption("Recent AI requests")
+            st.dataframe(summary["recent_llm_calls"], hide_index=True, use_container_width=True)
+        log_cache_stats = recent_logs.stats()
+        st.caption(
+            f"Recent log cache: {log_cache_stats['users']} users, {log_cache_stats['bytes'] / 1024:.0f} KiB, "
+            f"{log_cache_stats['hits']} hits / {log_cache_stats['misses']} misses"
+        )
+        st.caption("Ollama endpoints")
+        st.dataframe(get_router().status(), hide_index=True, use_container_width=True)
+        if st.button("Write metrics dump"):
+            json_path, prometheus_path = metrics.dump()
+            st.success(f"Wrote {json_path} and {prometheus_path}")
 
 st.set_page_config(page_title="Personal Health Coach", layout="wide")
 
-# Sidebar for user selection/creation
-st.sidebar.title("User Management")
-user_option = st.sidebar.radio("Choose Option", ["Existing User", "New User"])
-
-if user_option == "New User":
-    with st.sidebar.form("user_form"):
-        username = st.text_input("Username")
-        age = st.number_input("Age", min_value=1, max_value=120)
-        weight = st.number_input("Weight (kg)", min_value=1.0)
-        height = st.number_input("Height (cm)", min_value=1.0)
-        fitness_goal = st.selectbox("Fitness Goal", [
-            "Weight Loss", "Muscle Gain", "Maintenance", "Endurance", "General Fitness"
-        ])
-        dietary_preferences = st.multiselect("Dietary Preferences", [
-            "Vegetarian", "Vegan", "Gluten-Free", "Dairy-Free", "Keto", "Paleo", "No Restrictions"
+backfill_rollups()
+response_cache = get_response_cache()
+job_queue = get_job_queue()
+motivation_pool = get_motivation_pool()
+
+def render_dashboard(session, user_id):
+    st.header("Fitness & Nutrition Dashboard")
+
+    window_days = st.selectbox("Time window", [7, 30, 90, 365], format_func=lambda days: f"Last {days} days")
+    start_date = window_start(window_days)
+
+    # Fitness data, from the recent log cache or (for long windows) the daily rollups
+    fitness_stats = recent_logs.fitness_summary(session, user_id, start_date)
+
+    if fitness_stats['sessions']:
+        # Figures are memoized per (user, window, data version); the
+        # per-day rows are only loaded when the figure has to be rebuilt
+        fitness_version = (user_id, window_days, start_date, fitness_stats['sessions'], fitness_stats['total_duration'])
+        fig1 = create_fitness_chart(lambda: recent_logs.fitness_daily(session, user_id, start_date), fitness_version)
+        if fig1:
+            st.plotly_chart(fig1, use_container_width=True)
+    
+        # Summary statistics
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Total Exercise Time", f"{fitness_stats['total_duration']} minutes")
+        with col2:
+            st.metric("Average Session", f"{fitness_stats['avg_duration']:.1f} minutes")
+        with col3:
+            st.metric("Calories Burned", f"{fitness_stats['total_calories']:.0f}")
+    else:
+        st.info(f"No fitness data available for the last {window_days} days.")
+
+    st.divider()
+
+    # Nutrition data
+    nutrition_stats = recent_logs.nutrition_summary(session, user_id, start_date)
+
+    if nutrition_stats['meals']:
+        nutrition_version = (user_id, window_days, start_date, nutrition_stats['meals'], nutrition_stats['total_calories'])
+        nutrition_data = functools.lru_cache(maxsize=1)(lambda: recent_logs.nutrition_daily(session, user_id, start_date))
+    
+        fig2 = create_nutrition_chart(nutrition_data, nutrition_version)
+        if fig2:
+            st.plotly_chart(fig2, use_container_width=True)
+    
+        fig3 = create_macronutrient_chart(nutrition_data, nutrition_version)
+        if fig3:
+            st.plotly_chart(fig3, use_container_width=True)
+    
+        # Summary statistics
+        avg_daily_calories = nutrition_stats['total_calories'] / window_days
+        avg_protein = nutrition_stats['total_protein'] / window_days
+        avg_carbs = nutrition_stats['total_carbs'] / window_days
+        avg_fats = nutrition_stats['total_fats'] / window_days
+    
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Avg. Daily Calories", f"{avg_daily_calories:.0f}")
+        with col2:
+            st.metric("Avg. Protein", f"{avg_protein:.1f}g")
+        with col3:
+            st.metric("Avg. Carbs", f"{avg_carbs:.1f}g")
+        with col4:
+            st.metric("Avg. Fats", f"{avg_fats:.1f}g")
+    else:
+        st.info(f"No nutrition data available for the last {window_days} days.")
+
+    st.divider()
+
+    # Archived history is only read when asked for
+    if st.toggle("Show long-term trends", key="show_trends"):
+        show_trends(session, user_id)
+
+def show_trends(session, user_id):
+    period = st.radio("Group by", ["Month", "Year"], horizontal=True, key="trend_period")
+    trends = monthly_trends if period == "Month" else yearly_trends
+
+    # As on the dashboard, the figures are memoized per data version and the
+    # Parquet partitions are only read when a figure has to be rebuilt
+    version = (user_id, period, trends_version(session, user_id))
+
+    def nutrition():
+        data = trends(session, 'nutrition', user_id)
+        data['avg_daily_calories'] = [
+            calories / days if days else 0 for calories, days in zip(data['calories'], data['days'])
+        ]
+        return data
+
+    fitness_fig = create_trend_chart(lambda: trends(session, 'fitness', user_id), 'duration',
+                                     f"Exercise per {period.lower()}", "Minutes", version)
+    nutrition_fig = create_trend_chart(nutrition, 'avg_daily_calories',
+                                       f"Average daily calories per {period.lower()}", "Calories", version)
+    if not fitness_fig and not nutrition_fig:
+        st.info("No history yet.")
+        return
+
+    col1, col2 = st.columns(2)
+    with col1:
+        if fitness_fig:
+            st.plotly_chart(fitness_fig, use_container_width=True)
+    with col2:
+        if nutrition_fig:
+            st.plotly_chart(nutrition_fig, use_container_width=True)
+
+def render_activity_form(session, user_id):
+    st.header("Log Fitness Activity")
+    with st.form("fitness_form"):
+        activity_type = st.selectbox("Activity Type", [
+            "Running", "Walking", "Cycling", "Swimming", "Weight Training", 
+            "Yoga", "Pilates", "HIIT", "Other"
         ])
-        
-        submitted = st.form_submit_button("Create User")
+        duration = st.number_input("Duration (minutes)", min_value=1, max_value=300)
+        calories_burned = st.number_input("Calories Burned", min_value=1)
+        notes = st.text_area("Notes")
+    
+        submitted = st.form_submit_button("Log Activity")
         if submitted:
-            new_user = User(
-                username=username,
-                age=age,
-                weight=weight,
-                height=height,
-                fitness_goal=fitness_goal,
-                dietary_preferences=", ".join(dietary_preferences)
+            new_log = FitnessLog(
+                user_id=user_id,
+                activity_type=activity_type,
+                duration=duration,
+                calories_burned=calories_burned,
+                notes=notes
             )
-            session.add(new_user)
+            session.add(new_log)
+            session.flush()
+            record_fitness_log(session, new_log)
             session.commit()
-            st.sidebar.success(f"User {username} created successfully!")
+            recent_logs.add_fitness_log(new_log)
+            st.success("Activity logged successfully!")
+
+def render_meal_builder(user_id):
+    # Foods picked from the local database; returns the meal's description and
+    # summed macros to prefill the form
+    food_index = get_food_index()
+    items = st.session_state.setdefault(f"meal_items_{user_id}", [])
 
-# Get all users for selection
-users = session.query(User).all()
-user_options = {user.username: user.id for user in users}
+    query = st.text_input("Search foods", key="food_search", placeholder="e.g. chicken breast")
+    matches = food_index.search(query) if query else []
+    if query and not matches:
+        st.caption("No matching foods.")
+    if matches:
+        col1, col2 = st.columns([3, 1])
+        food_id = col1.selectbox("Food", matches, format_func=food_index.name, key="food_pick")
+        grams = col2.number_input("Grams", min_value=1.0, value=float(food_index.servings[food_id]), step=10.0,
+                                  key=f"food_grams_{food_id}")
+        if st.button("Add to meal"):
+            items.append((food_id, grams))
 
-if user_options:
-    selected_username = st.sidebar.selectbox("Select User", list(user_options.keys()))
+    if not items:
+        return "", food_index.meal_totals([], [])
+
+    food_ids = [food_id for food_id, _ in items]
+    grams = [grams for _, grams in items]
+    for (food_id, weight), (calories, protein, carbs, fats) in zip(items, food_index.portions(food_ids, grams)):
+        st.write(f"{food_index.name(food_id)}, {weight:g} g: {calories:.0f} kcal, "
+                 f"P {protein:.1f} g, C {carbs:.1f} g, F {fats:.1f} g")
+    if st.button("Clear meal"):
+        items.clear()
+        st.rerun()
+    description = ", ".join(f"{food_index.name(food_id)} ({weight:g} g)" for food_id, weight in items)
+    return description, food_index.meal_totals(food_ids, grams)
+
+def render_nutrition_form(session, user_id):
+    st.header("Log Nutrition Intake")
+    description, totals = render_meal_builder(user_id)
+    with st.form("nutrition_form"):
+        meal_type = st.selectbox("Meal Type", ["Breakfast", "Lunch", "Dinner", "Snack"])
+        food_item = st.text_input("Food Item", value=description)
+        calories = st.number_input("Calories", min_value=0, value=int(round(totals['calories'])))
+        protein = st.number_input("Protein (g)", min_value=0.0, value=round(totals['protein'], 1))
+        carbs = st.number_input("Carbs (g)", min_value=0.0, value=round(totals['carbs'], 1))
+        fats = st.number_input("Fats (g)", min_value=0.0, value=round(totals['fats'], 1))
     
-    if selected_username:
-        user_id = user_options[selected_username]
-        user = session.query(User).filter(User.id == user_id).first()
-        
-        st.title(f"Personal Health Coach for {selected_username}")
-        st.subheader(f"Goal: {user.fitness_goal}")
-        
-        # Display user info
-        with st.expander("User Profile"):
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.write(f"**Age:** {user.age}")
-                st.write(f"**Weight:** {user.weight} kg")
-            with col2:
-                st.write(f"**Height:** {user.height} cm")
-                st.write(f"**Dietary Preferences:** {user.dietary_preferences}")
-            with col3:
-                st.write(f"**Goal:** {user.fitness_goal}")
-                st.write(f"**Member since:** {user.created_at.date()}")
-        
-        # Display motivational text
-        if st.button("Get Motivational Message"):
-            motivational_text = motivational_agent.generate_motivational_text(user_id, user.fitness_goal, user)
-            new_text = MotivationalText(
+        submitted = st.form_submit_button("Log Food")
+        if submitted:
+            new_log = NutritionLog(
                 user_id=user_id,
-                text_content=motivational_text
+                meal_type=meal_type,
+                food_item=food_item,
+                calories=calories,
+                protein=protein,
+                carbs=carbs,
+                fats=fats
             )
-            session.add(new_text)
+            session.add(new_log)
+            session.flush()
+            record_nutrition_log(session, new_log)
             session.commit()
-            st.info(motivational_text)
+            recent_logs.add_nutrition_log(new_log)
+            # The next meal starts empty
+            st.session_state[f"meal_items_{user_id}"] = []
+            st.success("Food logged successfully!")
+
+def show_latest_plan(session, model, user_id):
+    # Plans written by batch_plans.py (or an earlier generation) show up without waiting for the model
+    plan = latest_plan(session, model, user_id)
+    if plan is not None:
+        st.caption(f"Latest plan, generated {plan.generated_at.strftime('%Y-%m-%d %H:%M')}")
+        st.write(plan.plan_content)
+
+def render_generate_plans(session, user_id):
+    st.header("Generate Personalized Plans")
+
+    if st.button("Generate Everything", key="all_btn"):
+        # Workout plan, nutrition plan and motivation are generated concurrently
+        st.session_state[f"all_job_{user_id}"] = job_queue.submit(user_id, "all")
+    show_job(f"all_job_{user_id}", "Plans")
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.subheader("Workout Plan")
+        if st.button("Generate Workout Plan", key="workout_btn"):
+            # Generation runs in the background; partial output is shown while it streams
+            st.session_state[f"workout_job_{user_id}"] = job_queue.submit(user_id, "workout_plan")
+        if f"workout_job_{user_id}" in st.session_state:
+            show_job(f"workout_job_{user_id}", "Workout plan")
+        else:
+            show_latest_plan(session, WorkoutPlan, user_id)
+
+    with col2:
+        st.subheader("Nutrition Plan")
+        if st.button("Generate Nutrition Plan", key="nutrition_btn"):
+            st.session_state[f"nutrition_job_{user_id}"] = job_queue.submit(user_id, "nutrition_plan")
+        if f"nutrition_job_{user_id}" in st.session_state:
+            show_job(f"nutrition_job_{user_id}", "Nutrition plan")
+        else:
+            show_latest_plan(session, NutritionPlan, user_id)
+
+def render_history(session, user_id):
+    st.header("History")
+
+    history_option = st.selectbox("View History", [
+        "Fitness Logs", "Nutrition Logs", "Workout Plans", "Nutrition Plans", "Motivational Texts"
+    ])
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        from_date = st.date_input("From", value=None, key="history_from")
+    with col2:
+        to_date = st.date_input("To", value=None, key="history_to")
+    with col3:
+        page_size = st.selectbox("Entries per page", [10, 20, 50], index=1, key="history_page_size")
+
+    start = datetime.combine(from_date, datetime.min.time()) if from_date else None
+    end = datetime.combine(to_date, datetime.min.time()) + timedelta(days=1) if to_date else None
+
+    if history_option == "Fitness Logs":
+        def render_fitness_log(log):
+            st.write(f"{log.created_at.date()}: {log.activity_type} for {log.duration} minutes, {log.calories_burned} calories burned")
+            if log.notes:
+                st.caption(f"Notes: {log.notes}")
+        show_history_page(session, FitnessLog, user_id, render_fitness_log, "No fitness logs found.", page_size, start, end)
+
+    elif history_option == "Nutrition Logs":
+        def render_nutrition_log(log):
+            st.write(f"{log.created_at.date()}: {log.meal_type} - {log.food_item}")
+            st.caption(f"Calories: {log.calories}, Protein: {log.protein}g, Carbs: {log.carbs}g, Fats: {log.fats}g")
+        show_history_page(session, NutritionLog, user_id, render_nutrition_log, "No nutrition logs found.", page_size, start, end)
+
+    elif history_option in ("Workout Plans", "Nutrition Plans"):
+        def render_plan(plan):
+            st.write(f"Generated on: {plan.generated_at.date()}")
+            st.write(plan.plan_content)
+        if history_option == "Workout Plans":
+            show_history_page(session, WorkoutPlan, user_id, render_plan, "No workout plans found.", page_size, start, end)
+        else:
+            show_history_page(session, NutritionPlan, user_id, render_plan, "No nutrition plans found.", page_size, start, end)
+
+    elif history_option == "Motivational Texts":
+        def render_text(text):
+            st.write(f"Generated on: {text.generated_at.date()}")
+            st.info(text.text_content)
+        show_history_page(session, MotivationalText, user_id, render_text, "No motivational texts found.", page_size, start, end)
+
+VIEWS = {
+    "Dashboard": render_dashboard,
+    "Log Activities": render_activity_form,
+    "Nutrition Log": render_nutrition_form,
+    "Generate Plans": render_generate_plans,
+    "History": render_history
+}
+
+def main(session):
+    # Sidebar for user selection/creation
+    st.sidebar.title("User Management")
+    user_option = st.sidebar.radio("Choose Option", ["Existing User", "New User"])
+
+    if user_option == "New User":
+        with st.sidebar.form("user_form"):
+            username = st.text_input("Username")
+            age = st.number_input("Age", min_value=1, max_value=120)
+            weight = st.number_input("Weight (kg)", min_value=1.0)
+            height = st.number_input("Height (cm)", min_value=1.0)
+            fitness_goal = st.selectbox("Fitness Goal", [
+                "Weight Loss", "Muscle Gain", "Maintenance", "Endurance", "General Fitness"
+            ])
+            dietary_preferences = st.multiselect("Dietary Preferences", [
+                "Vegetarian", "Vegan", "Gluten-Free", "Dairy-Free", "Keto", "Paleo", "No Restrictions"
+            ])
         
-        # Tabs for different functionalities
-        tab1, tab2, tab3, tab4, tab5 = st.tabs([
-            "Dashboard", "Log Activities", "Nutrition Log", "Generate Plans", "History"
-        ])
+            submitted = st.form_submit_button("Create User")
+            if submitted:
+                new_user = User(
+                    username=username,
+                    age=age,
+                    weight=weight,
+                    height=height,
+                    fitness_goal=fitness_goal,
+                    dietary_preferences=", ".join(dietary_preferences)
+                )
+                session.add(new_user)
+                session.commit()
+                st.sidebar.success(f"User {username} created successfully!")
+
+    # Get all users for selection
+    users = session.query(User).all()
+    user_options = {user.username: user.id for user in users}
+
+    if user_options:
+        selected_username = st.sidebar.selectbox("Select User", list(user_options.keys()))
+    
+        if selected_username:
+            user_id = user_options[selected_username]
+            user = session.query(User).filter(User.id == user_id).first()
+        
+            st.title(f"Personal Health Coach for {selected_username}")
+            st.subheader(f"Goal: {user.fitness_goal}")
         
-        with tab1:
-            st.header("Fitness & Nutrition Dashboard")
-            
-            # Get last 7 days of data
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=7)
-            
-            # Fitness data
-            fitness_logs = session.query(FitnessLog).filter(
-                FitnessLog.user_id == user_id,
-                FitnessLog.created_at >= start_date
-            ).all()
-            
-            if fitness_logs:
-                fitness_data = [{
-                    'date': log.created_at.date(),
-                    'duration': log.duration,
-                    'calories_burned': log.calories_burned,
-                    'activity': log.activity_type
-                } for log in fitness_logs]
-                
-                fig1 = create_fitness_chart(fitness_data)
-                if fig1:
-                    st.plotly_chart(fig1, use_container_width=True)
-                
-                # Summary statistics
-                total_duration = sum(log.duration for log in fitness_logs)
-                avg_duration = total_duration / len(fitness_logs)
-                total_calories = sum(log.calories_burned for log in fitness_logs)
-                
+            # Display user info
+            with st.expander("User Profile"):
                 col1, col2, col3 = st.columns(3)
                 with col1:
-                    st.metric("Total Exercise Time", f"{total_duration} minutes")
+                    st.write(f"**Age:** {user.age}")
+                    st.write(f"**Weight:** {user.weight} kg")
                 with col2:
-                    st.metric("Average Session", f"{avg_duration:.1f} minutes")
+                    st.write(f"**Height:** {user.height} cm")
+                    st.write(f"**Dietary Preferences:** {user.dietary_preferences}")
                 with col3:
-                    st.metric("Calories Burned", f"{total_calories:.0f}")
-            else:
-                st.info("No fitness data available for the last 7 days.")
-            
-            st.divider()
-            
-            # Nutrition data
-            nutrition_logs = session.query(NutritionLog).filter(
-                NutritionLog.user_id == user_id,
-                NutritionLog.created_at >= start_date
-            ).all()
-            
-            if nutrition_logs:
-                nutrition_data = [{
-                    'date': log.created_at.date(),
-                    'calories': log.calories,
-                    'protein': log.protein,
-                    'carbs': log.carbs,
-                    'fats': log.fats
-                } for log in nutrition_logs]
-                
-                fig2 = create_nutrition_chart(nutrition_data)
-                if fig2:
-                    st.plotly_chart(fig2, use_container_width=True)
-                
-                fig3 = create_macronutrient_chart(nutrition_data)
-                if fig3:
-                    st.plotly_chart(fig3, use_container_width=True)
-                
-                # Summary statistics
-                total_calories = sum(log.calories for log in nutrition_logs)
-                avg_daily_calories = total_calories / 7
-                avg_protein = sum(log.protein for log in nutrition_logs) / 7
-                avg_carbs = sum(log.carbs for log in nutrition_logs) / 7
-                avg_fats = sum(log.fats for log in nutrition_logs) / 7
-                
-                col1, col2, col3, col4 = st.columns(4)
-                with col1:
-                    st.metric("Avg. Daily Calories", f"{avg_daily_calories:.0f}")
-                with col2:
-                    st.metric("Avg. Protein", f"{avg_protein:.1f}g")
-                with col3:
-                    st.metric("Avg. Carbs", f"{avg_carbs:.1f}g")
-                with col4:
-                    st.metric("Avg. Fats", f"{avg_fats:.1f}g")
-            else:
-                st.info("No nutrition data available for the last 7 days.")
+                    st.write(f"**Goal:** {user.fitness_goal}")
+                    st.write(f"**Member since:** {user.created_at.date()}")
         
-        with tab2:
-            st.header("Log Fitness Activity")
-            with st.form("fitness_form"):
-                activity_type = st.selectbox("Activity Type", [
-                    "Running", "Walking", "Cycling", "Swimming", "Weight Training", 
-                    "Yoga", "Pilates", "HIIT", "Other"
-                ])
-                duration = st.number_input("Duration (minutes)", min_value=1, max_value=300)
-                calories_burned = st.number_input("Calories Burned", min_value=1)
-                notes = st.text_area("Notes")
-                
-                submitted = st.form_submit_button("Log Activity")
-                if submitted:
-                    new_log = FitnessLog(
-                        user_id=user_id,
-                        activity_type=activity_type,
-                        duration=duration,
-                        calories_burned=calories_burned,
-                        notes=notes
-                    )
-                    session.add(new_log)
-                    session.commit()
-                    st.success("Activity logged successfully!")
+            # Display motivational text
+            if st.button("Get Motivational Message"):
+                # Served from the pool when it has a message the user hasn't seen,
+                # otherwise generated on the spot
+                message = motivation_pool.take(user)
+                st.session_state[f"motivation_text_{user_id}"] = message
+                st.session_state.pop(f"motivation_job_{user_id}", None)
+                if message is None:
+                    st.session_state[f"motivation_job_{user_id}"] = job_queue.submit(user_id, "motivation")
+            if st.session_state.get(f"motivation_text_{user_id}"):
+                st.info(st.session_state[f"motivation_text_{user_id}"])
+            show_job(f"motivation_job_{user_id}", "Motivational message")
         
-        with tab3:
-            st.header("Log Nutrition Intake")
-            with st.form("nutrition_form"):
-                meal_type = st.selectbox("Meal Type", ["Breakfast", "Lunch", "Dinner", "Snack"])
-                food_item = st.text_input("Food Item")
-                calories = st.number_input("Calories", min_value=0)
-                protein = st.number_input("Protein (g)", min_value=0.0)
-                carbs = st.number_input("Carbs (g)", min_value=0.0)
-                fats = st.number_input("Fats (g)", min_value=0.0)
-                
-                submitted = st.form_submit_button("Log Food")
-                if submitted:
-                    new_log = NutritionLog(
-                        user_id=user_id,
-                        meal_type=meal_type,
-                        food_item=food_item,
-                        calories=calories,
-                        protein=protein,
-                        carbs=carbs,
-                        fats=fats
-                    )
-                    session.add(new_log)
-                    session.commit()
-                    st.success("Food logged successfully!")
-        
-        with tab4:
-            st.header("Generate Personalized Plans")
-            
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.subheader("Workout Plan")
-                if st.button("Generate Workout Plan", key="workout_btn"):
-                    with st.spinner("Analyzing your fitness data..."):
-                        analysis = fitness_agent.analyze_fitness_data(user_id, session)
-                        new_plan = WorkoutPlan(
-                            user_id=user_id,
-                            plan_content=analysis
-                        )
-                        session.add(new_plan)
-                        session.commit()
-                        st.success("Workout plan generated!")
-                        st.write(analysis)
-            
-            with col2:
-                st.subheader("Nutrition Plan")
-                if st.button("Generate Nutrition Plan", key="nutrition_btn"):
-                    with st.spinner("Analyzing your nutrition data..."):
-                        analysis = nutrition_agent.analyze_nutrition_data(user_id, session)
-                        new_plan = NutritionPlan(
-                            user_id=user_id,
-                            plan_content=analysis
-                        )
-                        session.add(new_plan)
-                        session.commit()
-                        st.success("Nutrition plan generated!")
-                        st.write(analysis)
-        
-        with tab5:
-            st.header("History")
-            
-            history_option = st.selectbox("View History", [
-                "Fitness Logs", "Nutrition Logs", "Workout Plans", "Nutrition Plans", "Motivational Texts"
-            ])
-            
-            if history_option == "Fitness Logs":
-                logs = session.query(FitnessLog).filter(FitnessLog.user_id == user_id).order_by(FitnessLog.created_at.desc()).all()
-                if logs:
-                    for log in logs:
-                        st.write(f"{log.created_at.date()}: {log.activity_type} for {log.duration} minutes, {log.calories_burned} calories burned")
-                        if log.notes:
-                            st.caption(f"Notes: {log.notes}")
-                        st.divider()
-                else:
-                    st.info("No fitness logs found.")
-            
-            elif history_option == "Nutrition Logs":
-                logs = session.query(NutritionLog).filter(NutritionLog.user_id == user_id).order_by(NutritionLog.created_at.desc()).all()
-                if logs:
-                    for log in logs:
-                        st.write(f"{log.created_at.date()}: {log.meal_type} - {log.food_item}")
-                        st.caption(f"Calories: {log.calories}, Protein: {log.protein}g, Carbs: {log.carbs}g, Fats: {log.fats}g")
-                        st.divider()
-                else:
-                    st.info("No nutrition logs found.")
-            
-            elif history_option == "Workout Plans":
-                plans = session.query(WorkoutPlan).filter(WorkoutPlan.user_id == user_id).order_by(WorkoutPlan.generated_at.desc()).all()
-                if plans:
-                    for plan in plans:
-                        st.write(f"Generated on: {plan.generated_at.date()}")
-                        st.write(plan.plan_content)
-                        st.divider()
-                else:
-                    st.info("No workout plans found.")
-            
-            elif history_option == "Nutrition Plans":
-                plans = session.query(NutritionPlan).filter(NutritionPlan.user_id == user_id).order_by(NutritionPlan.generated_at.desc()).all()
-                if plans:
-                    for plan in plans:
-                        st.write(f"Generated on: {plan.generated_at.date()}")
-                        st.write(plan.plan_content)
-                        st.divider()
-                else:
-                    st.info("No nutrition plans found.")
-            
-            elif history_option == "Motivational Texts":
-                texts = session.query(MotivationalText).filter(MotivationalText.user_id == user_id).order_by(MotivationalText.generated_at.desc()).all()
-                if texts:
-                    for text in texts:
-                        st.write(f"Generated on: {text.generated_at.date()}")
-                        st.info(text.text_content)
-                        st.divider()
-                else:
-                    st.info("No motivational texts found.")
-else:
-    st.info("Please create a user first using the sidebar.")
-
-# Add footer with instructions
-st.sidebar.markdown("---")
-st.sidebar.info(
-    "Ensure Ollama is running with the Llama 3 model installed. "
-    "Run 'ollama pull llama3' in terminal if you haven't already."
-)
\ No newline at end of file
+            # Only the selected view's code runs on each rerun
+            view = st.radio("View", list(VIEWS), horizontal=True, label_visibility="collapsed", key="active_view")
+            with metrics.render_span(view):
+                VIEWS[view](session, user_id)
+    else:
+        st.info("Please create a user first using the sidebar.")
+
+    # Add footer with instructions
+    st.sidebar.markdown("---")
+    cache_stats = response_cache.stats()
+    st.sidebar.caption(
+        f"AI response cache: {cache_stats['entries']} entries, "
+        f"{cache_stats['hits']} hits / {cache_stats['misses']} misses"
+    )
+    st.sidebar.caption(
+        f"AI jobs in progress: {job_queue.pending_count()} "
+        f"(max {job_queue.fitness_agent.backend.max_concurrent} AI requests at a time)"
+    )
+    pool_stats = motivation_pool.stats()
+    st.sidebar.caption(
+        f"Motivational messages ready: {pool_stats['entries']} in {pool_stats['buckets']} groups"
+        + (f", {pool_stats['pending_refills']} queued for refill" if pool_stats['pending_refills'] else "")
+    )
+    st.sidebar.info(
+        "Ensure Ollama is running with the Llama 3 model installed. "
+        "Run 'ollama pull llama3' in terminal if you haven't already."
+    )
+    show_diagnostics()
+
+session = Session()
+try:
+    with metrics.render_span("Full rerun"):
+        main(session)
+except Exception:
+    session.rollback()
+    raise
+finally:
+    Session.remove()
\ No newline at end of file
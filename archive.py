@@ -0,0 +1,202 @@
+# archive.py
+# Moves fitness and nutrition logs older than a horizon out of SQLite into
+# Parquet files, one per user and month, and records them in a manifest:
+#
+#   archive/
+#     manifest.json
+#     fitness/user_id=1/month=2024-03.parquet
+#     nutrition/user_id=1/month=2024-03.parquet
+#
+#   python archive.py run [--older-than-days 365] [--vacuum]
+#
+# The cutoff is aligned to the start of a month so every partition and every
+# remaining rollup day is complete. Archived rows are removed from the log and
+# rollup tables; analytics.py reads them back for long-range trends. The
+# horizon can't be shorter than the dashboard's longest window.
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete
+from database import (
+    get_engine, session_scope, FitnessLog, NutritionLog,
+    DailyFitnessRollup, DailyActivityRollup, DailyNutritionRollup
+)
+
+# pyarrow is imported inside the functions that read or write partitions
+
+ARCHIVE_DIR = os.environ.get('HEALTH_COACH_ARCHIVE_DIR', 'archive')
+DEFAULT_HORIZON_DAYS = 365
+MIN_HORIZON_DAYS = 365
+DEFAULT_BATCH_SIZE = 5000
+
+# Columns kept per kind, and the rollup tables covering the same rows
+ARCHIVE_KINDS = {
+    'fitness': (FitnessLog, ('id', 'user_id', 'activity_type', 'duration', 'calories_burned', 'notes', 'created_at'),
+                (DailyFitnessRollup, DailyActivityRollup)),
+    'nutrition': (NutritionLog, ('id', 'user_id', 'meal_type', 'food_item', 'calories', 'protein', 'carbs', 'fats', 'created_at'),
+                  (DailyNutritionRollup,))
+}
+
+def _schema(kind):
+    import pyarrow as pa
+
+    types = {
+        'id': pa.int64(),
+        'user_id': pa.int64(),
+        'activity_type': pa.string(),
+        'duration': pa.int32(),
+        'calories_burned': pa.float64(),
+        'notes': pa.string(),
+        'meal_type': pa.string(),
+        'food_item': pa.string(),
+        'calories': pa.float64(),
+        'protein': pa.float64(),
+        'carbs': pa.float64(),
+        'fats': pa.float64(),
+        'created_at': pa.timestamp('us')
+    }
+    return pa.schema([(name, types[name]) for name in ARCHIVE_KINDS[kind][1]])
+
+def partition_path(kind, user_id, month, archive_dir=None):
+    return os.path.join(archive_dir or ARCHIVE_DIR, kind, f"user_id={user_id}", f"month={month}.parquet")
+
+def month_start(moment):
+    return datetime(moment.year, moment.month, 1)
+
+# Manifest
+
+def load_manifest(archive_dir=None):
+    path = os.path.join(archive_dir or ARCHIVE_DIR, 'manifest.json')
+    if not os.path.exists(path):
+        return {'version': 1, 'archived_before': {}, 'partitions': {}}
+    with open(path) as f:
+        return json.load(f)
+
+def save_manifest(manifest, archive_dir=None):
+    archive_dir = archive_dir or ARCHIVE_DIR
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, 'manifest.json')
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+def partitions(kind, user_id, archive_dir=None, manifest=None):
+    # Manifest entries for one user's partitions (every user's with
+    # user_id=None), by user and then oldest month first
+    manifest = manifest or load_manifest(archive_dir)
+    entries = [entry for entry in manifest['partitions'].values()
+               if entry['kind'] == kind and user_id in (None, entry['user_id'])]
+    return sorted(entries, key=lambda entry: (entry['user_id'], entry['month']))
+
+# Archival
+
+def _write_partition(kind, user_id, month, rows, archive_dir):
+    # Merges with an existing partition, dropping rows already archived by an
+    # earlier, interrupted run
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    columns = ARCHIVE_KINDS[kind][1]
+    table = pa.Table.from_pylist([dict(zip(columns, row)) for row in rows], schema=_schema(kind))
+    path = partition_path(kind, user_id, month, archive_dir)
+    if os.path.exists(path):
+        existing = pq.read_table(path)
+        table = table.filter(pc.invert(pc.is_in(table['id'], value_set=existing['id'])))
+        table = pa.concat_tables([existing, table]).sort_by('created_at')
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+
+    created_at = table['created_at']
+    return {
+        'kind': kind,
+        'user_id': user_id,
+        'month': month,
+        'path': os.path.relpath(path, archive_dir),
+        'rows': table.num_rows,
+        'min_created_at': pc.min(created_at).as_py().isoformat(),
+        'max_created_at': pc.max(created_at).as_py().isoformat(),
+        'archived_at': datetime.utcnow().isoformat()
+    }
+
+def archive_logs(kind, older_than_days=DEFAULT_HORIZON_DAYS, engine=None, archive_dir=None,
+                 batch_size=DEFAULT_BATCH_SIZE):
+    if older_than_days < MIN_HORIZON_DAYS:
+        raise ValueError(f"older_than_days must be at least {MIN_HORIZON_DAYS}, the dashboard's longest window")
+
+    engine = engine or get_engine()
+    archive_dir = archive_dir or ARCHIVE_DIR
+    model, columns, rollup_models = ARCHIVE_KINDS[kind]
+    cutoff = month_start(datetime.utcnow() - timedelta(days=older_than_days))
+    manifest = load_manifest(archive_dir)
+    started = time.perf_counter()
+
+    stmt = select(*(model.__table__.c[name] for name in columns)).where(
+        model.created_at < cutoff
+    ).order_by(model.user_id, model.created_at)
+
+    archived = 0
+    max_id = None
+    with engine.connect() as conn:
+        # Rows stream in (user, time) order, so each partition is written once its rows are complete
+        result = conn.execution_options(yield_per=batch_size).execute(stmt)
+        current, rows = None, []
+        for row in result:
+            key = (row.user_id, row.created_at.strftime('%Y-%m'))
+            if key != current and rows:
+                entry = _write_partition(kind, *current, rows, archive_dir)
+                manifest['partitions'][entry['path']] = entry
+                archived += len(rows)
+                rows = []
+            current = key
+            rows.append(tuple(row))
+            max_id = row.id if max_id is None else max(max_id, row.id)
+        if rows:
+            entry = _write_partition(kind, *current, rows, archive_dir)
+            manifest['partitions'][entry['path']] = entry
+            archived += len(rows)
+
+    # The manifest is saved before any row is deleted; a rerun after a crash merges into the same partitions
+    manifest['archived_before'][kind] = max(cutoff.isoformat(), manifest['archived_before'].get(kind, ''))
+    save_manifest(manifest, archive_dir)
+
+    if max_id is not None:
+        with session_scope(engine) as session:
+            session.execute(delete(model).where(model.created_at < cutoff, model.id <= max_id))
+            for rollup_model in rollup_models:
+                session.execute(delete(rollup_model).where(rollup_model.day < cutoff.date()))
+
+    return {'rows': archived, 'cutoff': cutoff, 'seconds': time.perf_counter() - started}
+
+def vacuum(engine=None):
+    # Returns the space freed by archival to the filesystem
+    engine = engine or get_engine()
+    with engine.connect() as conn:
+        conn.exec_driver_sql("VACUUM")
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old fitness and nutrition logs to Parquet")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run = subparsers.add_parser("run", help="Move logs older than the horizon into the archive")
+    run.add_argument("--older-than-days", type=int, default=DEFAULT_HORIZON_DAYS)
+    run.add_argument("--kind", choices=sorted(ARCHIVE_KINDS), help="Only archive this kind of log")
+    run.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    run.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    run.add_argument("--vacuum", action="store_true", help="Compact the database file afterwards")
+    args = parser.parse_args()
+
+    for kind in [args.kind] if args.kind else sorted(ARCHIVE_KINDS):
+        stats = archive_logs(kind, args.older_than_days, archive_dir=args.archive_dir, batch_size=args.batch_size)
+        print(f"Archived {stats['rows']} {kind} logs from before {stats['cutoff']:%Y-%m-%d} in {stats['seconds']:.2f}s")
+    if args.vacuum:
+        vacuum()
+        print("Database vacuumed")
+
+if __name__ == "__main__":
+    main()
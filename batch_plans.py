@@ -0,0 +1,190 @@
+# batch_plans.py
+# Generates workout and nutrition plans for every user ahead of time, so the
+# Generate Plans tab has a ready-made plan instead of waiting for the model.
+#
+#   python batch_plans.py run [--concurrency 4] [--restart]
+#   python batch_plans.py schedule --at 03:00
+#
+# The 7-day aggregates for all users are read with one query per table. A plan
+# is skipped when nothing was logged since the previous one and that plan is
+# still within the window. Finished users are recorded in a checkpoint file, so
+# an interrupted run picks up where it stopped.
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from database import get_engine, session_scope, User, FitnessLog, NutritionLog, WorkoutPlan, NutritionPlan
+from agents import FitnessCoachAgent, NutritionCoachAgent
+from llm_backend import OllamaBackend
+from queries import (window_start, fitness_summaries, fitness_activity_counts_by_user, nutrition_summaries,
+                     latest_timestamps)
+
+WINDOW_DAYS = 7
+DEFAULT_CONCURRENCY = 4
+DEFAULT_CHECKPOINT = os.environ.get('HEALTH_COACH_BATCH_CHECKPOINT', 'batch_plans_checkpoint.json')
+# A checkpoint older than this belongs to an earlier batch and is ignored
+CHECKPOINT_MAX_AGE = timedelta(hours=12)
+
+EMPTY_FITNESS = {'total_duration': 0, 'total_calories': 0, 'sessions': 0, 'avg_duration': 0}
+EMPTY_NUTRITION = {'total_calories': 0, 'total_protein': 0, 'total_carbs': 0, 'total_fats': 0, 'meals': 0}
+
+def _needs_plan(last_log, last_plan, now):
+    if last_plan is None:
+        return True
+    if now - last_plan > timedelta(days=WINDOW_DAYS):
+        return True
+    return last_log is not None and last_log > last_plan
+
+def collect_requests(session, fitness_agent, nutrition_agent, skip_user_ids=()):
+    # One (user_id, [(plan_model, agent, prompt), ...]) entry per user with something to generate
+    now = datetime.utcnow()
+    start_date = window_start(WINDOW_DAYS)
+    fitness = fitness_summaries(session, start_date)
+    activities = fitness_activity_counts_by_user(session, start_date)
+    nutrition = nutrition_summaries(session, start_date)
+    last_workout = latest_timestamps(session, FitnessLog)
+    last_meal = latest_timestamps(session, NutritionLog)
+    last_workout_plan = latest_timestamps(session, WorkoutPlan)
+    last_nutrition_plan = latest_timestamps(session, NutritionPlan)
+
+    requests = []
+    for user in session.query(User).order_by(User.id):
+        if user.id in skip_user_ids:
+            continue
+        plans = []
+        if _needs_plan(last_workout.get(user.id), last_workout_plan.get(user.id), now):
+            prompt = fitness_agent.format_prompt(user.id, fitness.get(user.id, EMPTY_FITNESS), activities.get(user.id, []))
+            plans.append((WorkoutPlan, fitness_agent, prompt))
+        if _needs_plan(last_meal.get(user.id), last_nutrition_plan.get(user.id), now):
+            prompt = nutrition_agent.format_prompt(user.id, nutrition.get(user.id, EMPTY_NUTRITION), user)
+            plans.append((NutritionPlan, nutrition_agent, prompt))
+        if plans:
+            requests.append((user.id, plans))
+    return requests
+
+class Checkpoint:
+    # User ids finished by the current run, rewritten atomically after each user
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self.started_at = datetime.utcnow().isoformat()
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            if datetime.utcnow() - datetime.fromisoformat(state['started_at']) <= CHECKPOINT_MAX_AGE:
+                self.done = set(state['done'])
+                self.started_at = state['started_at']
+
+    def mark(self, user_id):
+        self.done.add(user_id)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'started_at': self.started_at, 'done': sorted(self.done)}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def run_batch(engine=None, backend=None, concurrency=DEFAULT_CONCURRENCY, checkpoint_path=DEFAULT_CHECKPOINT, restart=False):
+    engine = engine or get_engine()
+    backend = backend or OllamaBackend()
+    fitness_agent = FitnessCoachAgent(backend)
+    nutrition_agent = NutritionCoachAgent(backend)
+
+    checkpoint = Checkpoint(checkpoint_path)
+    if restart:
+        checkpoint.clear()
+        checkpoint = Checkpoint(checkpoint_path)
+    resumed = len(checkpoint.done)
+
+    with session_scope(engine) as session:
+        requests = collect_requests(session, fitness_agent, nutrition_agent, checkpoint.done)
+
+    stats = {'users': len(requests), 'resumed': resumed, 'plans': 0, 'failed': 0}
+    lock = threading.Lock()
+    started = time.perf_counter()
+
+    def save(user_id, plans, results):
+        # Runs off the event loop; only successful generations are stored
+        failed = sum(isinstance(result, Exception) for result in results)
+        with session_scope(engine) as session:
+            for (plan_model, agent, prompt), result in zip(plans, results):
+                if not isinstance(result, Exception):
+                    session.add(plan_model(user_id=user_id, plan_content=result))
+        with lock:
+            stats['plans'] += len(results) - failed
+            stats['failed'] += failed
+            if not failed:
+                checkpoint.mark(user_id)
+
+    async def generate_all():
+        # At most `concurrency` requests are in flight across all users
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def generate(agent, prompt):
+            async with semaphore:
+                return await backend.achat(agent.model, agent.system_prompt, prompt, task=agent.task)
+
+        async def generate_user(user_id, plans):
+            results = await asyncio.gather(
+                *(generate(agent, prompt) for plan_model, agent, prompt in plans),
+                return_exceptions=True
+            )
+            await asyncio.to_thread(save, user_id, plans, results)
+
+        await asyncio.gather(*(generate_user(user_id, plans) for user_id, plans in requests))
+
+    backend.run(generate_all())
+    if stats['failed'] == 0:
+        checkpoint.clear()
+
+    stats['seconds'] = time.perf_counter() - started
+    return stats
+
+def _seconds_until(at):
+    hour, minute = (int(part) for part in at.split(':'))
+    now = datetime.now()
+    target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return (target - now).total_seconds()
+
+def _report(stats):
+    print(
+        f"Generated {stats['plans']} plans for {stats['users']} users "
+        f"({stats['failed']} failed, {stats['resumed']} users already done before resuming) "
+        f"in {stats['seconds']:.1f}s"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate workout and nutrition plans for all users")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("run", "Run one batch now"), ("schedule", "Run a batch every day at a set time")):
+        command = subparsers.add_parser(name, help=help_text)
+        command.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Maximum concurrent model requests")
+        command.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+        if name == "run":
+            command.add_argument("--restart", action="store_true", help="Ignore the checkpoint of an interrupted run")
+        else:
+            command.add_argument("--at", default="03:00", help="Local time of day, HH:MM")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        stats = run_batch(concurrency=args.concurrency, checkpoint_path=args.checkpoint, restart=args.restart)
+        _report(stats)
+        return
+
+    while True:
+        time.sleep(_seconds_until(args.at))
+        try:
+            _report(run_batch(concurrency=args.concurrency, checkpoint_path=args.checkpoint))
+        except Exception as e:
+            print(f"Batch failed: {e}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
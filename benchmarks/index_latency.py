@@ -0,0 +1,82 @@
+# benchmarks/index_latency.py
+# Measures 7-day range and History query latency on the raw logs as fitness_logs grows, with and
+# without the (user_id, created_at) composite index.
+#
+#   python -m benchmarks.index_latency --sizes 10000 100000 1000000
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert
+from database import init_db, get_session, FitnessLog
+
+ACTIVITIES = ["Running", "Walking", "Cycling", "Swimming", "Weight Training", "Yoga", "Pilates", "HIIT", "Other"]
+
+def populate(engine, rows, users, seed=0, batch_size=50000):
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        for offset in range(0, rows, batch_size):
+            conn.execute(insert(FitnessLog.__table__), [{
+                'user_id': rng.randint(1, users),
+                'activity_type': rng.choice(ACTIVITIES),
+                'duration': rng.randint(10, 120),
+                'calories_burned': rng.uniform(50, 900),
+                'notes': None,
+                'created_at': now - timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+            } for _ in range(min(batch_size, rows - offset))])
+
+def time_queries(session, users, repeats, seed=1):
+    rng = random.Random(seed)
+    start_date = datetime.utcnow() - timedelta(days=7)
+    timings = {'dashboard': [], 'history': []}
+    for _ in range(repeats):
+        user_id = rng.randint(1, users)
+
+        started = time.perf_counter()
+        session.query(func.sum(FitnessLog.duration), func.count(FitnessLog.id)).filter(
+            FitnessLog.user_id == user_id,
+            FitnessLog.created_at >= start_date
+        ).one()
+        timings['dashboard'].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        session.query(FitnessLog).filter(FitnessLog.user_id == user_id).order_by(FitnessLog.created_at.desc()).limit(50).all()
+        timings['history'].append(time.perf_counter() - started)
+    return {name: statistics.median(values) * 1000 for name, values in timings.items()}
+
+def run(sizes, users, repeats):
+    results = []
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = init_db(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            populate(engine, rows, users)
+            session = get_session(engine)
+
+            indexed = time_queries(session, users, repeats)
+            for index in FitnessLog.__table__.indexes:
+                index.drop(engine)
+            unindexed = time_queries(session, users, repeats)
+
+            session.close()
+            engine.dispose()
+        results.append({'rows': rows, 'indexed_ms': indexed, 'unindexed_ms': unindexed})
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-user query latency with and without composite indexes")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'query':>10} {'indexed ms':>12} {'no index ms':>12}")
+    for result in run(args.sizes, args.users, args.repeats):
+        for query in ('dashboard', 'history'):
+            print(f"{result['rows']:>10} {query:>10} {result['indexed_ms'][query]:>12.3f} {result['unindexed_ms'][query]:>12.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+# benchmarks/run.py
+# Repeatable benchmarks for dashboard queries (SQL and through the log cache),
+# History pages, agent prompt construction and end-to-end plan generation
+# against the stub Ollama server.
+#
+#   python -m benchmarks.run --users 200 --days 90 --output results.json
+#   python -m benchmarks.run --output new.json --compare results.json
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from database import init_db, get_session, User, FitnessLog, NutritionLog, WorkoutPlan, MotivationalText
+from queries import window_start, fitness_summary, fitness_daily, nutrition_summary, nutrition_daily, history_page
+from log_cache import RecentLogCache
+from llm_backend import OllamaBackend
+from agents import FitnessCoachAgent, NutritionCoachAgent, MotivationalAgent, generate_all
+from benchmarks.synthetic import generate
+from benchmarks.stub_ollama import StubOllamaServer
+
+def _stats(samples):
+    samples = sorted(samples)
+    return {
+        'runs': len(samples),
+        'mean_ms': statistics.fmean(samples) * 1000,
+        'median_ms': statistics.median(samples) * 1000,
+        'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+        'min_ms': samples[0] * 1000
+    }
+
+def measure(fn, repeats, rng, users):
+    samples = []
+    for _ in range(repeats):
+        user_id = rng.randint(1, users)
+        started = time.perf_counter()
+        fn(user_id)
+        samples.append(time.perf_counter() - started)
+    return _stats(samples)
+
+def bench_dashboard(session, days):
+    # The SQL aggregates, which the dashboard falls back to for windows longer
+    # than the log cache holds
+    start_day = window_start(days)
+    def run(user_id):
+        fitness_summary(session, user_id, start_day)
+        fitness_daily(session, user_id, start_day)
+        nutrition_summary(session, user_id, start_day)
+        nutrition_daily(session, user_id, start_day)
+    return run
+
+def bench_dashboard_cached(session, cache, days, cold):
+    # The dashboard's reads through the log cache; cold drops the user's entry
+    # first so every run loads it from the database
+    start_day = window_start(days)
+    def run(user_id):
+        if cold:
+            cache.invalidate(user_id)
+        cache.fitness_summary(session, user_id, start_day)
+        cache.fitness_daily(session, user_id, start_day)
+        cache.nutrition_summary(session, user_id, start_day)
+        cache.nutrition_daily(session, user_id, start_day)
+    return run
+
+def bench_history(session, model, pages):
+    def run(user_id):
+        cursor = None
+        for _ in range(pages):
+            rows, cursor = history_page(session, model, user_id, 20, cursor)
+            if cursor is None:
+                break
+    return run
+
+def bench_prompts(session, agents):
+    fitness_agent, nutrition_agent, motivational_agent = agents
+    def run(user_id):
+        user = session.query(User).filter(User.id == user_id).first()
+        fitness_agent.build_prompt(user_id, session)
+        nutrition_agent.build_prompt(user_id, session)
+        motivational_agent.build_prompt(user.fitness_goal, user)
+    return run
+
+def bench_stream_plan(session, fitness_agent, first_token_samples):
+    def run(user_id):
+        started = time.perf_counter()
+        for i, _ in enumerate(fitness_agent.stream_fitness_data(user_id, session)):
+            if i == 0:
+                first_token_samples.append(time.perf_counter() - started)
+    return run
+
+def bench_generate_all(session, agents):
+    def run(user_id):
+        generate_all(user_id, session, *agents)
+    return run
+
+def bench_plan_update(session, full_agent, update_agent, repeats, rng, users):
+    # Times a full workout plan, stores it as the user's latest plan and times
+    # updating it from the logs since. Each agent talks to a stub sized for its
+    # kind of reply, and both stubs charge for prompt processing, so the update
+    # prompt's extra input is weighed against its shorter output.
+    full, update = [], []
+    for _ in range(repeats):
+        user_id = rng.randint(1, users)
+        started = time.perf_counter()
+        prompt, _ = full_agent.prepare(user_id, session, incremental=False)
+        plan = full_agent.backend.chat(full_agent.model, full_agent.system_prompt, prompt, task=full_agent.task)
+        full.append(time.perf_counter() - started)
+        session.add(WorkoutPlan(user_id=user_id, plan_content=plan))
+        session.commit()
+
+        started = time.perf_counter()
+        update_agent.analyze_fitness_data(user_id, session)
+        update.append(time.perf_counter() - started)
+    return _stats(full), _stats(update)
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(args):
+    rng = random.Random(args.seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = init_db(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        started = time.perf_counter()
+        counts = generate(engine, users=args.users, days=args.days, seed=args.seed)
+        setup_seconds = time.perf_counter() - started
+        session = get_session(engine)
+
+        results['dashboard_7d'] = measure(bench_dashboard(session, 7), args.repeats, rng, args.users)
+        results['dashboard_90d'] = measure(bench_dashboard(session, 90), args.repeats, rng, args.users)
+        cache = RecentLogCache()
+        results['dashboard_7d_cache_cold'] = measure(bench_dashboard_cached(session, cache, 7, True), args.repeats, rng, args.users)
+        for user_id in range(1, args.users + 1):
+            bench_dashboard_cached(session, cache, 7, False)(user_id)
+        results['dashboard_7d_cache_warm'] = measure(bench_dashboard_cached(session, cache, 7, False), args.repeats, rng, args.users)
+        results['dashboard_30d_cache_warm'] = measure(bench_dashboard_cached(session, cache, 30, False), args.repeats, rng, args.users)
+        results['history_fitness_first_page'] = measure(bench_history(session, FitnessLog, 1), args.repeats, rng, args.users)
+        results['history_nutrition_5_pages'] = measure(bench_history(session, NutritionLog, 5), args.repeats, rng, args.users)
+        results['history_workout_plans'] = measure(bench_history(session, WorkoutPlan, 1), args.repeats, rng, args.users)
+        results['history_motivational_texts'] = measure(bench_history(session, MotivationalText, 1), args.repeats, rng, args.users)
+
+        with StubOllamaServer(latency=args.stub_latency, tokens_per_sec=args.stub_tokens_per_sec,
+                              response_tokens=args.stub_response_tokens) as stub:
+            backend = OllamaBackend(host=stub.url)
+            agents = (FitnessCoachAgent(backend), NutritionCoachAgent(backend), MotivationalAgent(backend))
+            results['agent_prompts'] = measure(bench_prompts(session, agents), args.repeats, rng, args.users)
+
+            first_token = []
+            results['plan_stream_total'] = measure(bench_stream_plan(session, agents[0], first_token), args.llm_repeats, rng, args.users)
+            results['plan_stream_first_token'] = _stats(first_token)
+            results['generate_all'] = measure(bench_generate_all(session, agents), args.llm_repeats, rng, args.users)
+            backend.close()
+
+        # Runs last, as it adds a plan per sampled user
+        stub_options = {'latency': args.stub_latency, 'tokens_per_sec': args.stub_tokens_per_sec,
+                        'prompt_tokens_per_sec': args.stub_prompt_tokens_per_sec}
+        with StubOllamaServer(response_tokens=args.stub_plan_tokens, **stub_options) as plan_stub, \
+                StubOllamaServer(response_tokens=args.stub_update_tokens, **stub_options) as update_stub:
+            full_backend, update_backend = OllamaBackend(host=plan_stub.url), OllamaBackend(host=update_stub.url)
+            results['plan_full_regeneration'], results['plan_update'] = bench_plan_update(
+                session, FitnessCoachAgent(full_backend), FitnessCoachAgent(update_backend), args.llm_repeats, rng, args.users
+            )
+            full_backend.close()
+            update_backend.close()
+
+        session.close()
+        engine.dispose()
+
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'params': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'rows': counts,
+        'setup_seconds': setup_seconds,
+        'results': results
+    }
+
+def compare(current, previous):
+    print(f"\n{'benchmark':<30} {'previous ms':>12} {'current ms':>12} {'change':>8}")
+    for name, stats in current['results'].items():
+        before = previous.get('results', {}).get(name)
+        if before is None:
+            continue
+        change = (stats['median_ms'] - before['median_ms']) / before['median_ms'] * 100 if before['median_ms'] else 0
+        print(f"{name:<30} {before['median_ms']:>12.3f} {stats['median_ms']:>12.3f} {change:>+7.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the health coach benchmark suite")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--llm-repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stub-latency", type=float, default=0.05)
+    parser.add_argument("--stub-tokens-per-sec", type=float, default=500.0)
+    parser.add_argument("--stub-response-tokens", type=int, default=50)
+    parser.add_argument("--stub-plan-tokens", type=int, default=400, help="Reply length of a full plan")
+    parser.add_argument("--stub-update-tokens", type=int, default=80, help="Reply length of a plan update")
+    parser.add_argument("--stub-prompt-tokens-per-sec", type=float, default=2500.0,
+                        help="Prompt processing rate for the plan update benchmark")
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    parser.add_argument("--compare", help="Previous results JSON to compare against")
+    args = parser.parse_args()
+
+    report = run(args)
+    print(f"{'benchmark':<30} {'median ms':>10} {'p95 ms':>10} {'runs':>6}")
+    for name, stats in report['results'].items():
+        print(f"{name:<30} {stats['median_ms']:>10.3f} {stats['p95_ms']:>10.3f} {stats['runs']:>6}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# benchmarks/startup.py
+# Cold start and per-view rerun times of app.py, measured with Streamlit's
+# AppTest in fresh subprocesses. Point --app-dir at another checkout to get
+# before/after numbers for the same synthetic data.
+#
+#   python -m benchmarks.startup --output startup.json
+#   python -m benchmarks.startup --app-dir ../health-coach-old
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from database import init_db
+from benchmarks.synthetic import generate
+from benchmarks.stub_ollama import StubOllamaServer
+
+IMPORT_SCRIPT = """
+import sys, time
+started = time.perf_counter()
+import database, agents, utils
+print(time.perf_counter() - started)
+"""
+
+# Script time comes from the app's own "Full rerun" span, since AppTest's
+# wall time is dominated by its polling interval
+RERUN_SCRIPT = """
+import json, sys
+from streamlit.testing.v1 import AppTest
+from instrumentation import metrics
+
+def full_reruns():
+    return [record["seconds"] for record in metrics.renders if record["view"] == "Full rerun"]
+
+runs = int(sys.argv[1])
+at = AppTest.from_file("app.py", default_timeout=120)
+at.run()
+results = {"first_run": full_reruns()[-1]}
+
+# Views are a radio when only the active one renders, otherwise every tab runs
+views = [radio for radio in at.radio if radio.label == "View"]
+options = views[0].options if views else ["All tabs"]
+for option in options:
+    if views:
+        at.radio(key="active_view").set_value(option)
+        at.run()
+    for _ in range(runs):
+        at.run()
+    samples = sorted(full_reruns()[-runs:])
+    results[option] = samples[len(samples) // 2]
+print(json.dumps(results))
+"""
+
+def _run_child(script, app_dir, env, *args):
+    output = subprocess.check_output([sys.executable, "-c", script, *args], cwd=app_dir, env=env, text=True, stderr=subprocess.DEVNULL)
+    return output.strip().splitlines()[-1]
+
+def run(app_dir, runs, users, days):
+    results = {'app_dir': os.path.abspath(app_dir)}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = f"sqlite:///{os.path.join(tmp, 'startup.db')}"
+        generate(init_db(db_url), users=users, days=days)
+
+        with StubOllamaServer(latency=0.01, tokens_per_sec=0, response_tokens=5) as stub:
+            env = dict(os.environ, HEALTH_COACH_DB_URL=db_url, OLLAMA_HOST=stub.url, PYTHONPATH=os.path.abspath(app_dir))
+            imports = sorted(float(_run_child(IMPORT_SCRIPT, app_dir, env)) for _ in range(runs))
+            results['import_seconds'] = imports[len(imports) // 2]
+            results['reruns_seconds'] = json.loads(_run_child(RERUN_SCRIPT, app_dir, env, str(runs)))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app.py cold start and rerun times")
+    parser.add_argument("--app-dir", default=".")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    results = run(args.app_dir, args.runs, args.users, args.days)
+    print(f"Module import (database, agents, utils): {results['import_seconds'] * 1000:.1f} ms")
+    print("Script run time:")
+    for name, seconds in results['reruns_seconds'].items():
+        print(f"{name:<20} {seconds * 1000:>8.1f} ms")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
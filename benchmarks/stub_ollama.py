@@ -0,0 +1,157 @@
+# benchmarks/stub_ollama.py
+# A local stand-in for the Ollama HTTP API (/api/chat, /api/tags, /api/version)
+# with configurable latency, prompt processing and token rate, for benchmarks
+# and offline runs.
+#
+#   python -m benchmarks.stub_ollama --port 11435 --latency 0.5 --tokens-per-sec 40
+#   OLLAMA_HOST=http://127.0.0.1:11435 streamlit run app.py
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class StubOllamaServer:
+    def __init__(self, host='127.0.0.1', port=0, latency=0.2, tokens_per_sec=50.0, response_tokens=60,
+                 prompt_tokens_per_sec=None):
+        self.latency = latency
+        # Prompt words processed per second before the first token; None is instant
+        self.prompt_tokens_per_sec = prompt_tokens_per_sec
+        self.tokens_per_sec = tokens_per_sec
+        self.response_tokens = response_tokens
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='stub-ollama', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, payload, status=200):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == '/api/version':
+                    self._send_json({'version': '0.0.0-stub'})
+                elif self.path == '/api/tags':
+                    self._send_json({'models': [{'name': 'llama3:latest', 'model': 'llama3:latest'}]})
+                else:
+                    body = b'Ollama is running'
+                    self.send_response(200)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+            def do_POST(self):
+                if self.path != '/api/chat':
+                    self._send_json({'error': 'not found'}, status=404)
+                    return
+
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                stub._count_request()
+                prompt = ' '.join(message.get('content', '') for message in request.get('messages', []))
+                prompt_tokens = len(prompt.split())
+                started = time.perf_counter()
+                time.sleep(stub.latency)
+                if stub.prompt_tokens_per_sec:
+                    time.sleep(prompt_tokens / stub.prompt_tokens_per_sec)
+
+                tokens = [f"token{i} " for i in range(stub.response_tokens)]
+                delay = 1.0 / stub.tokens_per_sec if stub.tokens_per_sec else 0
+
+                def chunk(content, done):
+                    payload = {
+                        'model': request.get('model', 'llama3'),
+                        'created_at': datetime.now(timezone.utc).isoformat(),
+                        'message': {'role': 'assistant', 'content': content},
+                        'done': done
+                    }
+                    if done:
+                        elapsed = int((time.perf_counter() - started) * 1e9)
+                        payload.update({
+                            'done_reason': 'stop',
+                            'total_duration': elapsed,
+                            'prompt_eval_count': prompt_tokens,
+                            'eval_count': len(tokens),
+                            'eval_duration': int(len(tokens) * delay * 1e9)
+                        })
+                    return payload
+
+                if request.get('stream', True):
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/x-ndjson')
+                    self.send_header('Transfer-Encoding', 'chunked')
+                    self.end_headers()
+                    for token in tokens:
+                        time.sleep(delay)
+                        self._write_chunk(json.dumps(chunk(token, False)) + '\n')
+                    self._write_chunk(json.dumps(chunk('', True)) + '\n')
+                    self._write_chunk('')
+                else:
+                    time.sleep(delay * len(tokens))
+                    self._send_json(chunk(''.join(tokens), True))
+
+            def _write_chunk(self, text):
+                data = text.encode('utf-8')
+                self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a stub Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0)
+    parser.add_argument("--response-tokens", type=int, default=60)
+    parser.add_argument("--prompt-tokens-per-sec", type=float, help="Prompt processing rate (default: instant)")
+    args = parser.parse_args()
+
+    server = StubOllamaServer(args.host, args.port, args.latency, args.tokens_per_sec, args.response_tokens,
+                              args.prompt_tokens_per_sec)
+    print(f"Stub Ollama listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# benchmarks/synthetic.py
+# Seeded synthetic data for benchmarks: users, fitness and nutrition logs,
+# plans and motivational texts, bulk inserted at a configurable scale.
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from database import session_scope, User, FitnessLog, NutritionLog, WorkoutPlan, NutritionPlan, MotivationalText
+from rollups import rebuild_rollups
+
+ACTIVITIES = ["Running", "Walking", "Cycling", "Swimming", "Weight Training", "Yoga", "Pilates", "HIIT", "Other"]
+MEAL_TYPES = ["Breakfast", "Lunch", "Dinner", "Snack"]
+FOODS = ["Oatmeal", "Chicken Salad", "Rice and Beans", "Greek Yogurt", "Salmon", "Pasta", "Apple", "Protein Shake"]
+GOALS = ["Weight Loss", "Muscle Gain", "Maintenance", "Endurance", "General Fitness"]
+PLAN_TEXT = "Day 1: 30 minutes of running. Day 2: strength training. Day 3: rest and stretching. " * 10
+
+def _insert_batched(conn, table, rows, batch_size=20000):
+    batch = []
+    inserted = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            conn.execute(insert(table), batch)
+            inserted += len(batch)
+            batch = []
+    if batch:
+        conn.execute(insert(table), batch)
+        inserted += len(batch)
+    return inserted
+
+def generate(engine, users=100, days=90, workouts_per_day=1.0, meals_per_day=3, plans_per_user=5, seed=0):
+    # Returns the number of rows written per table
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+
+    def moment(day):
+        return now - timedelta(days=day, minutes=rng.randint(0, 24 * 60 - 1))
+
+    def fitness_rows():
+        for user_id in range(1, users + 1):
+            for day in range(days):
+                for _ in range(int(workouts_per_day) + (rng.random() < workouts_per_day % 1)):
+                    yield {
+                        'user_id': user_id,
+                        'activity_type': rng.choice(ACTIVITIES),
+                        'duration': rng.randint(10, 120),
+                        'calories_burned': round(rng.uniform(50, 900), 1),
+                        'notes': None,
+                        'created_at': moment(day)
+                    }
+
+    def nutrition_rows():
+        for user_id in range(1, users + 1):
+            for day in range(days):
+                for _ in range(meals_per_day):
+                    yield {
+                        'user_id': user_id,
+                        'meal_type': rng.choice(MEAL_TYPES),
+                        'food_item': rng.choice(FOODS),
+                        'calories': round(rng.uniform(100, 900), 1),
+                        'protein': round(rng.uniform(0, 60), 1),
+                        'carbs': round(rng.uniform(0, 120), 1),
+                        'fats': round(rng.uniform(0, 40), 1),
+                        'created_at': moment(day)
+                    }
+
+    def plan_rows(content_column, text):
+        for user_id in range(1, users + 1):
+            for _ in range(plans_per_user):
+                yield {'user_id': user_id, content_column: text, 'generated_at': moment(rng.randint(0, days))}
+
+    counts = {}
+    with engine.begin() as conn:
+        counts['users'] = _insert_batched(conn, User.__table__, ({
+            'username': f"user{user_id}",
+            'age': rng.randint(18, 75),
+            'weight': round(rng.uniform(45, 120), 1),
+            'height': round(rng.uniform(150, 200), 1),
+            'fitness_goal': rng.choice(GOALS),
+            'dietary_preferences': "No Restrictions",
+            'created_at': now - timedelta(days=days)
+        } for user_id in range(1, users + 1)))
+
+        for name, table, rows in (
+            ('fitness_logs', FitnessLog.__table__, fitness_rows()),
+            ('nutrition_logs', NutritionLog.__table__, nutrition_rows()),
+            ('workout_plans', WorkoutPlan.__table__, plan_rows('plan_content', PLAN_TEXT)),
+            ('nutrition_plans', NutritionPlan.__table__, plan_rows('plan_content', PLAN_TEXT)),
+            ('motivational_texts', MotivationalText.__table__, plan_rows('text_content', "Keep going, you are doing great!"))
+        ):
+            counts[name] = _insert_batched(conn, table, rows)
+
+    with session_scope(engine) as session:
+        rebuild_rollups(session)
+    return counts
@@ -0,0 +1,228 @@
+# bulk.py
+# Streaming bulk import/export of fitness and nutrition logs as CSV or JSONL.
+# Exports include the months archive.py has moved to Parquet.
+#
+#   python bulk.py import fitness workouts.csv --user-id 1
+#   python bulk.py export nutrition meals.jsonl --user-id 1
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from itertools import chain, islice
+from sqlalchemy import insert, select
+from archive import ARCHIVE_DIR, partitions
+from database import get_engine, session_scope, User, FitnessLog, NutritionLog
+from rollups import rebuild_rollups
+
+def _whole_number(value):
+    # int() would truncate a JSON 5.7 but reject the same value as CSV text,
+    # so both are rejected
+    number = float(value)
+    if not number.is_integer():
+        raise ValueError(f"{value!r} is not a whole number")
+    return int(number)
+
+def _timestamp(value):
+    # Stored as naive UTC like every other log; values with an offset are converted
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+# Column name -> parser, for the columns a file may provide
+LOG_COLUMNS = {
+    'fitness': (FitnessLog, {
+        'user_id': _whole_number,
+        'activity_type': str,
+        'duration': _whole_number,
+        'calories_burned': float,
+        'notes': str,
+        'created_at': _timestamp
+    }),
+    'nutrition': (NutritionLog, {
+        'user_id': _whole_number,
+        'meal_type': str,
+        'food_item': str,
+        'calories': float,
+        'protein': float,
+        'carbs': float,
+        'fats': float,
+        'created_at': _timestamp
+    })
+}
+REQUIRED_COLUMNS = {
+    'fitness': ('user_id', 'activity_type'),
+    'nutrition': ('user_id', 'food_item')
+}
+DEFAULT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+def _file_format(path):
+    return 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+def read_rows(path):
+    # Yields one dict per record without loading the file into memory
+    with open(path, newline='', encoding='utf-8') as f:
+        if _file_format(path) == 'jsonl':
+            # Decoded in validate_rows, so one malformed line is skipped like any other bad record
+            for line in f:
+                if line.strip():
+                    yield line
+        else:
+            yield from csv.DictReader(f)
+
+class ImportErrors:
+    # Counts every skipped record but keeps only the first `limit` for the report
+    def __init__(self, limit=MAX_REPORTED_ERRORS):
+        self.limit = limit
+        self.count = 0
+        self.samples = []
+
+    def add(self, line_number, message):
+        self.count += 1
+        if len(self.samples) < self.limit:
+            self.samples.append((line_number, message))
+
+def validate_rows(rows, kind, user_id=None, errors=None, known_users=None):
+    # Parses and checks each record; invalid ones, and ones for users not in
+    # `known_users` when given, are reported in `errors` and skipped
+    model, columns = LOG_COLUMNS[kind]
+    for line_number, row in enumerate(rows, start=1):
+        try:
+            if isinstance(row, str):
+                row = json.loads(row)
+            if not isinstance(row, dict):
+                raise ValueError("record is not an object")
+            if user_id is not None:
+                row['user_id'] = user_id
+            clean = {}
+            for name, parse in columns.items():
+                value = row.get(name)
+                clean[name] = parse(value) if value not in (None, '') else None
+            missing = [name for name in REQUIRED_COLUMNS[kind] if clean[name] is None]
+            if missing:
+                raise ValueError(f"missing {', '.join(missing)}")
+            if known_users is not None and clean['user_id'] not in known_users:
+                raise ValueError(f"unknown user {clean['user_id']}")
+            if any(isinstance(value, (int, float)) and value < 0 for name, value in clean.items() if name != 'user_id'):
+                raise ValueError("negative value")
+        except (TypeError, ValueError, AttributeError) as e:
+            if errors is not None:
+                errors.add(line_number, str(e))
+            continue
+
+        if clean['created_at'] is None:
+            clean['created_at'] = datetime.utcnow()
+        yield clean
+
+def batched(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+def import_logs(kind, path, user_id=None, batch_size=DEFAULT_BATCH_SIZE, engine=None):
+    engine = engine or get_engine()
+    model, _ = LOG_COLUMNS[kind]
+    errors = ImportErrors()
+    user_ids = set()
+    imported = 0
+    started = time.perf_counter()
+
+    with engine.connect() as conn:
+        known_users = set(conn.execute(select(User.id)).scalars())
+
+    # One executemany insert and one commit per batch
+    try:
+        with engine.connect() as conn:
+            rows = validate_rows(read_rows(path), kind, user_id, errors, known_users)
+            for batch in batched(rows, batch_size):
+                with conn.begin():
+                    conn.execute(insert(model.__table__), batch)
+                user_ids.update(row['user_id'] for row in batch)
+                imported += len(batch)
+    finally:
+        # Batches already committed stay, so their users' rollups are rebuilt even if the import fails
+        with session_scope(engine) as session:
+            for affected_user in sorted(user_ids):
+                rebuild_rollups(session, affected_user)
+
+    seconds = time.perf_counter() - started
+    return {
+        'rows': imported,
+        'skipped': errors.count,
+        'errors': errors.samples,
+        'seconds': seconds,
+        'rows_per_sec': imported / seconds if seconds else 0
+    }
+
+def archived_rows(kind, user_id=None, archive_dir=None, batch_size=DEFAULT_BATCH_SIZE):
+    # Rows archive.py moved out of the database, as tuples in LOG_COLUMNS order,
+    # read batch_size at a time from each partition
+    import pyarrow.parquet as pq
+
+    archive_dir = archive_dir or ARCHIVE_DIR
+    names = list(LOG_COLUMNS[kind][1])
+    for entry in partitions(kind, user_id, archive_dir):
+        parquet = pq.ParquetFile(os.path.join(archive_dir, entry['path']))
+        for batch in parquet.iter_batches(batch_size=batch_size, columns=names):
+            yield from zip(*(batch.column(name).to_pylist() for name in names))
+
+def export_logs(kind, path, user_id=None, batch_size=DEFAULT_BATCH_SIZE, engine=None, archive_dir=None):
+    engine = engine or get_engine()
+    model, columns = LOG_COLUMNS[kind]
+    table_columns = [model.__table__.c[name] for name in columns]
+    stmt = select(*table_columns).order_by(model.id)
+    if user_id is not None:
+        stmt = stmt.where(model.user_id == user_id)
+
+    exported = 0
+    archived = sum(entry['rows'] for entry in partitions(kind, user_id, archive_dir))
+    started = time.perf_counter()
+    with engine.connect() as conn, open(path, 'w', newline='', encoding='utf-8') as f:
+        # Archived months first, then the rows still in the database, fetched
+        # from the cursor batch_size at a time
+        rows = chain(archived_rows(kind, user_id, archive_dir, batch_size),
+                     conn.execution_options(yield_per=batch_size).execute(stmt))
+        if _file_format(path) == 'jsonl':
+            for row in rows:
+                record = dict(zip(columns, row))
+                record['created_at'] = record['created_at'].isoformat() if record['created_at'] else None
+                f.write(json.dumps(record) + '\n')
+                exported += 1
+        else:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow([value.isoformat() if isinstance(value, datetime) else value for value in row])
+                exported += 1
+
+    seconds = time.perf_counter() - started
+    return {'rows': exported, 'archived': archived, 'seconds': seconds, 'rows_per_sec': exported / seconds if seconds else 0}
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import/export fitness and nutrition logs (CSV or JSONL)")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("kind", choices=sorted(LOG_COLUMNS))
+    parser.add_argument("path", help="File to read or write; .jsonl/.ndjson for JSON lines, anything else is CSV")
+    parser.add_argument("--user-id", type=int, help="Import all rows for this user / export only this user's rows")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.command == "import":
+        stats = import_logs(args.kind, args.path, args.user_id, args.batch_size)
+        for line_number, error in stats['errors'][:20]:
+            print(f"Skipped record {line_number}: {error}", file=sys.stderr)
+        print(f"Imported {stats['rows']} rows ({stats['skipped']} skipped) in {stats['seconds']:.2f}s, {stats['rows_per_sec']:.0f} rows/sec")
+    else:
+        stats = export_logs(args.kind, args.path, args.user_id, args.batch_size)
+        print(f"Exported {stats['rows']} rows ({stats['archived']} from the archive) in {stats['seconds']:.2f}s, "
+              f"{stats['rows_per_sec']:.0f} rows/sec")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
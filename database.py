@@ -1,9 +1,15 @@
 # database.py
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text
+from sqlalchemy import create_engine, event, Column, Integer, String, Float, Date, DateTime, Text, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, scoped_session
+from contextlib import contextmanager
 from datetime import datetime
 import os
+import threading
+
+# SQLite by default; PostgreSQL and MySQL/MariaDB URLs also work (see rollups._upsert)
+DATABASE_URL = os.environ.get('HEALTH_COACH_DB_URL', 'sqlite:///health_coach.db')
+SQLITE_BUSY_TIMEOUT_MS = 5000
 
 Base = declarative_base()
 
@@ -20,6 +26,9 @@ class User(Base):
 
 class FitnessLog(Base):
     __tablename__ = 'fitness_logs'
+    __table_args__ = (
+        Index('ix_fitness_logs_user_created', 'user_id', 'created_at'),
+    )
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, nullable=False)
     activity_type = Column(String(50), nullable=False)
@@ -30,6 +39,9 @@ class FitnessLog(Base):
 
 class NutritionLog(Base):
     __tablename__ = 'nutrition_logs'
+    __table_args__ = (
+        Index('ix_nutrition_logs_user_created', 'user_id', 'created_at'),
+    )
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, nullable=False)
     meal_type = Column(String(50))
@@ -42,6 +54,9 @@ class NutritionLog(Base):
 
 class WorkoutPlan(Base):
     __tablename__ = 'workout_plans'
+    __table_args__ = (
+        Index('ix_workout_plans_user_generated', 'user_id', 'generated_at'),
+    )
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, nullable=False)
     plan_content = Column(Text, nullable=False)
@@ -49,6 +64,9 @@ class WorkoutPlan(Base):
 
 class NutritionPlan(Base):
     __tablename__ = 'nutrition_plans'
+    __table_args__ = (
+        Index('ix_nutrition_plans_user_generated', 'user_id', 'generated_at'),
+    )
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, nullable=False)
     plan_content = Column(Text, nullable=False)
@@ -56,16 +74,136 @@ class NutritionPlan(Base):
 
 class MotivationalText(Base):
     __tablename__ = 'motivational_texts'
+    __table_args__ = (
+        Index('ix_motivational_texts_user_generated', 'user_id', 'generated_at'),
+    )
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, nullable=False)
     text_content = Column(Text, nullable=False)
     generated_at = Column(DateTime, default=datetime.utcnow)
 
-def init_db():
-    engine = create_engine('sqlite:///health_coach.db')
-    Base.metadata.create_all(engine)
-    return engine
+class MotivationPoolEntry(Base):
+    __tablename__ = 'motivation_pool'
+    id = Column(Integer, primary_key=True)
+    bucket = Column(String(100), nullable=False, index=True)  # fitness goal and profile band, see motivation_pool.py
+    text_content = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class MotivationServed(Base):
+    # Pool messages already shown to a user, so none is served twice
+    __tablename__ = 'motivation_served'
+    user_id = Column(Integer, primary_key=True)
+    entry_id = Column(Integer, primary_key=True)
+    served_at = Column(DateTime, default=datetime.utcnow)
+
+class DailyFitnessRollup(Base):
+    __tablename__ = 'daily_fitness_rollups'
+    user_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    duration = Column(Integer, nullable=False, default=0)
+    calories_burned = Column(Float, nullable=False, default=0)
+    sessions = Column(Integer, nullable=False, default=0)
+
+class DailyActivityRollup(Base):
+    __tablename__ = 'daily_activity_rollups'
+    user_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    activity_type = Column(String(50), primary_key=True)
+    sessions = Column(Integer, nullable=False, default=0)
+
+class DailyNutritionRollup(Base):
+    __tablename__ = 'daily_nutrition_rollups'
+    user_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    calories = Column(Float, nullable=False, default=0)
+    protein = Column(Float, nullable=False, default=0)
+    carbs = Column(Float, nullable=False, default=0)
+    fats = Column(Float, nullable=False, default=0)
+    meals = Column(Integer, nullable=False, default=0)
+
+class LLMCacheEntry(Base):
+    __tablename__ = 'llm_cache'
+    key = Column(String(64), primary_key=True)  # sha256 of model, prompts and options
+    model = Column(String(50), nullable=False)
+    response = Column(Text, nullable=False)
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_accessed = Column(DateTime, default=datetime.utcnow, index=True)
+
+class GenerationJob(Base):
+    __tablename__ = 'generation_jobs'
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    kind = Column(String(20), nullable=False)  # workout_plan, nutrition_plan, motivation or all
+    status = Column(String(20), nullable=False, default='pending', index=True)  # pending, running, done, failed
+    result = Column(Text)
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+def migrate_indexes(engine):
+    # create_all() skips tables that already exist, so indexes added to the
+    # models later are created here for existing databases
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+def _configure_sqlite(dbapi_connection, connection_record):
+    # WAL lets readers proceed while one writer commits; busy_timeout makes
+    # concurrent writers wait instead of failing with "database is locked"
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+_engines = {}
+_session_factories = {}
+_scoped_sessions = {}
+_engine_lock = threading.Lock()
+
+def get_engine(url=None):
+    # One engine (and connection pool) per database URL for the whole process
+    url = url or DATABASE_URL
+    with _engine_lock:
+        engine = _engines.get(url)
+        if engine is None:
+            engine = create_engine(url)
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', _configure_sqlite)
+            Base.metadata.create_all(engine)
+            migrate_indexes(engine)
+            _engines[url] = engine
+            _session_factories[engine] = sessionmaker(bind=engine)
+        return engine
+
+def init_db(url=None):
+    return get_engine(url)
 
 def get_session(engine):
-    Session = sessionmaker(bind=engine)
-    return Session()
\ No newline at end of file
+    factory = _session_factories.get(engine)
+    if factory is None:
+        factory = _session_factories.setdefault(engine, sessionmaker(bind=engine))
+    return factory()
+
+def get_scoped_session(engine=None):
+    # Thread-local session registry; call .remove() when the thread's unit of work ends
+    engine = engine or get_engine()
+    with _engine_lock:
+        registry = _scoped_sessions.get(engine)
+        if registry is None:
+            registry = _scoped_sessions[engine] = scoped_session(sessionmaker(bind=engine))
+        return registry
+
+@contextmanager
+def session_scope(engine=None):
+    session = get_session(engine or get_engine())
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
\ No newline at end of file
@@ -0,0 +1,401 @@
+# food_db.py
+# Offline food-composition database behind the Nutrition Log autocomplete.
+# A CSV of foods (name, calories, protein, carbs, fats per 100 g, and an
+# optional default serving_g) is compiled once into flat NumPy files:
+#
+#   food_index/
+#     meta.json            source file, its size and mtime, food count
+#     names.npy            UTF-8 names back to back, sliced by name_offsets.npy
+#     nutrients.npy        (foods, 4) per-100 g values
+#     word_*.npy           sorted words of every name and the foods containing them
+#     food_word_*.npy      the words of each food
+#     prefix_*.npy         merged posting lists of prefixes shared by many words
+#     trigram_*.npy        sorted trigram codes and the words containing them
+#
+#   python food_db.py build [path/to/foods.csv]
+#   python food_db.py search "chiken brest"
+#
+# The files are opened with mmap_mode='r', so loading the index costs a few
+# page faults rather than parsing the dataset, and it is rebuilt only when the
+# CSV changes. Words of the query are matched as prefixes of the words in a
+# name; a word that starts none is corrected to the closest word by trigrams.
+#
+# Foods are stored shortest name first, so a food's id is also its rank and
+# every posting list is in rank order. A search reads only the head of the
+# lists it needs, which keeps it under a millisecond however common the words
+# are; the trade-off is that a combination of common words matching none of
+# their first MAX_CANDIDATES foods goes unmatched.
+#
+# Only a small sample dataset ships in data/. Point HEALTH_COACH_FOOD_CSV at
+# a larger export (e.g. USDA FoodData Central converted to these columns).
+import argparse
+import bisect
+import csv
+import json
+import os
+import re
+import time
+import zlib
+import numpy as np
+
+FOOD_CSV = os.environ.get('HEALTH_COACH_FOOD_CSV', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'foods_sample.csv'))
+INDEX_DIR = os.environ.get('HEALTH_COACH_FOOD_INDEX_DIR', 'food_index')
+INDEX_VERSION = 2
+
+NUTRIENTS = ('calories', 'protein', 'carbs', 'fats')
+DEFAULT_SERVING = 100.0
+MIN_SIMILARITY = 0.4
+CANDIDATE_CAP = 256         # best-ranked foods taken from a posting list at a time
+MAX_CANDIDATES = 16384      # foods checked at most for a multi-word query
+WIDE_PREFIX_WORDS = 16      # prefixes matching more words than this get a merged posting list
+
+def normalize(text):
+    return ' '.join(re.findall(r'[a-z0-9]+', text.lower()))
+
+def _trigrams(normalized):
+    # Each word padded, as in pg_trgm, so word starts and ends weigh in; codes
+    # are 24-bit CRCs of the trigram
+    codes = set()
+    for word in normalized.split():
+        padded = f"  {word} "
+        codes.update(zlib.crc32(padded[i:i + 3].encode()) & 0xFFFFFF for i in range(len(padded) - 2))
+    return codes
+
+def _postings(keys, ids):
+    # Sorted unique keys and, CSR-style, the sorted food ids for each key
+    order = np.lexsort((ids, keys))
+    keys, ids = keys[order], ids[order]
+    unique, starts = np.unique(keys, return_index=True)
+    offsets = np.append(starts, len(keys)).astype(np.int64)
+    return unique, offsets, ids.astype(np.int32)
+
+def _strings(values):
+    # A list of str as one UTF-8 blob plus offsets
+    encoded = [value.encode() for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in encoded])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+def _ranges(values, starts, ends):
+    # values[starts[0]:ends[0]], values[starts[1]:ends[1]], ... in one gather
+    lengths = ends - starts
+    total = int(lengths.sum())
+    if not total:
+        return np.empty(0, dtype=values.dtype)
+    index = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths) + np.repeat(starts, lengths)
+    return values[index]
+
+def _heads(offsets, postings, lo, hi, count):
+    # The `count` best foods across the posting lists lo..hi-1; each list is in
+    # rank order, so only its first `count` entries can qualify
+    if hi - lo == 1:
+        return postings[offsets[lo]:min(offsets[hi], offsets[lo] + count)]
+    starts = np.asarray(offsets[lo:hi])
+    ends = np.minimum(np.asarray(offsets[lo + 1:hi + 1]), starts + count)
+    return _sorted_unique(_ranges(postings, starts, ends))[:count]
+
+def _sorted_unique(values):
+    # np.unique without its hashing, which is slower for these small int arrays
+    values = np.sort(values)
+    keep = np.ones(len(values), dtype=bool)
+    keep[1:] = values[1:] != values[:-1]
+    return values[keep]
+
+def _source_stamp(csv_path):
+    stat = os.stat(csv_path)
+    return {'source': os.path.abspath(csv_path), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+def build_index(csv_path=None, index_dir=None):
+    csv_path = csv_path or FOOD_CSV
+    index_dir = index_dir or INDEX_DIR
+    started = time.perf_counter()
+
+    foods = []
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            name = (row.get('name') or '').strip()
+            if not name:
+                continue
+            try:
+                values = [float(row.get(nutrient) or 0) for nutrient in NUTRIENTS]
+            except ValueError:
+                continue
+            foods.append((normalize(name), name, values, float(row.get('serving_g') or DEFAULT_SERVING)))
+    # Shortest names first: the id order is the ranking of equally good matches
+    foods.sort(key=lambda food: (len(food[0]), food[0]))
+
+    word_keys, word_ids = [], []
+    for food_id, (normalized, *_) in enumerate(foods):
+        words = set(normalized.split())
+        word_keys.extend(words)
+        word_ids.extend([food_id] * len(words))
+
+    # Words are ranked in bytes order so prefix ranges can be found by bisection
+    vocabulary = sorted(set(word_keys), key=str.encode)
+    word_codes = {word: code for code, word in enumerate(vocabulary)}
+    codes = np.array([word_codes[word] for word in word_keys], dtype=np.int64)
+    ids = np.array(word_ids, dtype=np.int64)
+    _, word_offsets, word_postings = _postings(codes, ids)
+    order = np.lexsort((codes, ids))
+    food_words = codes[order].astype(np.int32)
+    food_word_offsets = np.zeros(len(foods) + 1, dtype=np.int64)
+    food_word_offsets[1:] = np.cumsum(np.bincount(ids, minlength=len(foods)))
+
+    # Trigrams of the vocabulary, for correcting misspelled query words
+    trigram_keys, trigram_codes, trigram_counts = [], [], []
+    for code, word in enumerate(vocabulary):
+        trigrams = _trigrams(word)
+        trigram_keys.extend(trigrams)
+        trigram_codes.extend([code] * len(trigrams))
+        trigram_counts.append(len(trigrams))
+    trigram_unique, trigram_offsets, trigram_postings = _postings(
+        np.array(trigram_keys, dtype=np.int64), np.array(trigram_codes, dtype=np.int64)
+    )
+
+    # Prefixes spanning many words get their words' postings merged ahead of
+    # time, so a one- or two-letter query doesn't merge thousands of lists. The
+    # prefixes of one length split the vocabulary, so each length costs at most
+    # one more copy of the postings.
+    encoded = [word.encode() for word in vocabulary]
+    prefixes, merged = [], []
+    for prefix in sorted({word[:length] for word in encoded for length in range(1, len(word) + 1)}):
+        lo = bisect.bisect_left(encoded, prefix)
+        hi = bisect.bisect_left(encoded, prefix + b'\xff', lo)
+        if hi - lo > WIDE_PREFIX_WORDS:
+            prefixes.append(prefix.decode())
+            merged.append(_sorted_unique(word_postings[word_offsets[lo]:word_offsets[hi]]))
+    prefix_posting_offsets = np.zeros(len(merged) + 1, dtype=np.int64)
+    prefix_posting_offsets[1:] = np.cumsum([len(postings) for postings in merged])
+
+    names_blob, name_offsets = _strings([food[1] for food in foods])
+    words_blob, words_offsets = _strings(vocabulary)
+    prefix_blob, prefix_key_offsets = _strings(prefixes)
+
+    arrays = {
+        'names': names_blob,
+        'name_offsets': name_offsets,
+        'nutrients': np.array([food[2] for food in foods], dtype=np.float64).reshape(-1, len(NUTRIENTS)),
+        'servings': np.array([food[3] for food in foods], dtype=np.float32),
+        'words': words_blob,
+        'word_offsets': words_offsets,
+        'word_posting_offsets': word_offsets,
+        'word_postings': word_postings,
+        'food_word_offsets': food_word_offsets,
+        'food_words': food_words,
+        'prefixes': prefix_blob,
+        'prefix_offsets': prefix_key_offsets,
+        'prefix_posting_offsets': prefix_posting_offsets,
+        'prefix_postings': np.concatenate(merged).astype(np.int32) if merged else np.empty(0, dtype=np.int32),
+        'trigram_keys': trigram_unique.astype(np.int32),
+        'trigram_offsets': trigram_offsets,
+        'trigram_postings': trigram_postings,
+        'word_trigram_counts': np.array(trigram_counts, dtype=np.int16)
+    }
+
+    # Written next to the live index and swapped in, so a running app keeps its mapped files
+    os.makedirs(index_dir, exist_ok=True)
+    for name, array in arrays.items():
+        tmp_path = os.path.join(index_dir, f"{name}.tmp.npy")
+        np.save(tmp_path, array)
+        os.replace(tmp_path, os.path.join(index_dir, f"{name}.npy"))
+
+    meta = {'version': INDEX_VERSION, 'foods': len(foods), **_source_stamp(csv_path)}
+    tmp_path = os.path.join(index_dir, 'meta.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, os.path.join(index_dir, 'meta.json'))
+
+    return {'foods': len(foods), 'words': len(vocabulary), 'trigrams': len(trigram_unique),
+            'seconds': time.perf_counter() - started}
+
+def _is_current(csv_path, index_dir):
+    path = os.path.join(index_dir, 'meta.json')
+    if not os.path.exists(path):
+        return False
+    with open(path) as f:
+        meta = json.load(f)
+    return meta.get('version') == INDEX_VERSION and all(
+        meta.get(key) == value for key, value in _source_stamp(csv_path).items()
+    )
+
+class _Blob:
+    # Read-only sequence of the bytes strings in a blob, for bisect
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.blob[self.offsets[index]:self.offsets[index + 1]].tobytes()
+
+class FoodIndex:
+    def __init__(self, index_dir=None):
+        self.index_dir = index_dir or INDEX_DIR
+        with open(os.path.join(self.index_dir, 'meta.json')) as f:
+            self.meta = json.load(f)
+        for name in ('names', 'name_offsets', 'nutrients', 'servings', 'words', 'word_offsets',
+                     'word_posting_offsets', 'word_postings', 'food_word_offsets', 'food_words',
+                     'prefixes', 'prefix_offsets', 'prefix_posting_offsets', 'prefix_postings',
+                     'trigram_keys', 'trigram_offsets', 'trigram_postings', 'word_trigram_counts'):
+            # Plain ndarray views of the mapping; slicing a np.memmap costs more than the search itself
+            setattr(self, name, np.load(os.path.join(self.index_dir, f"{name}.npy"), mmap_mode='r').view(np.ndarray))
+        self._names = _Blob(self.names, self.name_offsets)
+        self._words = _Blob(self.words, self.word_offsets)
+        self._prefixes = _Blob(self.prefixes, self.prefix_offsets)
+
+    def __len__(self):
+        return len(self.name_offsets) - 1
+
+    def name(self, food_id):
+        return self._names[food_id].decode()
+
+    def food(self, food_id):
+        values = self.nutrients[food_id]
+        return {'id': int(food_id), 'name': self.name(food_id), 'serving_g': float(self.servings[food_id]),
+                **{nutrient: float(value) for nutrient, value in zip(NUTRIENTS, values)}}
+
+    def _word_range(self, prefix):
+        # Codes lo..hi-1 of the words starting with prefix
+        key = prefix.encode()
+        lo = bisect.bisect_left(self._words, key)
+        return lo, bisect.bisect_left(self._words, key + b'\xff', lo)
+
+    def _prefix_head(self, prefix, lo, hi, count):
+        # The `count` best foods with a word in lo..hi-1
+        if hi - lo > WIDE_PREFIX_WORDS:
+            index = bisect.bisect_left(self._prefixes, prefix.encode())
+            start = self.prefix_posting_offsets[index]
+            return self.prefix_postings[start:min(self.prefix_posting_offsets[index + 1], start + count)]
+        return _heads(self.word_posting_offsets, self.word_postings, lo, hi, count)
+
+    def _has_word_in(self, food_ids, lo, hi):
+        # Mask of the foods having a word with code in lo..hi-1
+        if hi - lo == 1:
+            # One word: binary search in its posting list, which is sorted
+            postings = self.word_postings[self.word_posting_offsets[lo]:self.word_posting_offsets[hi]]
+            found = np.minimum(np.searchsorted(postings, food_ids), len(postings) - 1)
+            return postings[found] == food_ids
+        starts = np.asarray(self.food_word_offsets[food_ids])
+        ends = np.asarray(self.food_word_offsets[food_ids + 1])
+        codes = _ranges(self.food_words, starts, ends)
+        hits = ((codes >= lo) & (codes < hi)).astype(np.int32)
+        # Every candidate came from a word posting list, so none has zero words
+        return np.add.reduceat(hits, np.cumsum(ends - starts) - (ends - starts)) > 0
+
+    def _prefix_search(self, terms, limit):
+        # Foods having, for every (prefix, lo, hi) term, a word with code in lo..hi-1
+        ranges = [(lo, hi) for _, lo, hi in terms]
+        sizes = [self.word_posting_offsets[hi] - self.word_posting_offsets[lo] for lo, hi in ranges]
+        driver = int(np.argmin(sizes))
+        prefix, lo, hi = terms[driver]
+        if len(terms) == 1:
+            return np.asarray(self._prefix_head(prefix, lo, hi, limit))
+
+        # Candidates come from the word with the fewest postings, best first, and
+        # are checked against the other words, rarest first, through each food's
+        # own words. More are taken while too few match, up to MAX_CANDIDATES.
+        others = [ranges[index] for index in np.argsort(sizes) if index != driver]
+        count, checked, matches = CANDIDATE_CAP, 0, []
+        while True:
+            ids = np.asarray(self._prefix_head(prefix, lo, hi, count), dtype=np.int64)
+            new = ids[checked:]
+            for word_lo, word_hi in others:
+                if len(new):
+                    new = new[self._has_word_in(new, word_lo, word_hi)]
+            matches.append(new)
+            checked = len(ids)
+            found = sum(len(match) for match in matches)
+            if found >= limit or checked < count or count >= MAX_CANDIDATES:
+                return np.concatenate(matches)[:limit]
+            count *= 4
+
+    def _correct(self, word):
+        # Code of the vocabulary word closest to a misspelled one by trigram
+        # (Jaccard) similarity, preferring the more common word; None if none is close
+        codes = np.array(sorted(_trigrams(word)), dtype=np.int32)
+        found = np.searchsorted(self.trigram_keys, codes)
+        valid = found < len(self.trigram_keys)
+        found = found[valid][self.trigram_keys[found[valid]] == codes[valid]]
+        if not len(found):
+            return None
+
+        words, shared = np.unique(
+            _ranges(self.trigram_postings, self.trigram_offsets[found], self.trigram_offsets[found + 1]),
+            return_counts=True
+        )
+        scores = shared / (len(codes) + self.word_trigram_counts[words] - shared)
+        frequency = self.word_posting_offsets[words + 1] - self.word_posting_offsets[words]
+        best = np.lexsort((-frequency, -scores))[0]
+        return int(words[best]) if scores[best] >= MIN_SIMILARITY else None
+
+    def search(self, query, limit=10):
+        # Food ids for the query, best first (shorter names first): every query
+        # word must start a word in the name; a word that starts none is replaced
+        # by the closest word in the vocabulary
+        words = normalize(query).split()
+        terms = []
+        for word in words:
+            lo, hi = self._word_range(word)
+            if lo == hi:
+                code = self._correct(word)
+                if code is None:
+                    return []
+                lo, hi = code, code + 1
+            terms.append((word, lo, hi))
+        if not terms:
+            return []
+        return [int(food_id) for food_id in self._prefix_search(terms, limit)]
+
+    def portions(self, food_ids, grams):
+        # Macros of each portion as a (items, 4) array, in NUTRIENTS order
+        food_ids = np.asarray(food_ids, dtype=np.int64)
+        grams = np.asarray(grams, dtype=np.float64)
+        return self.nutrients[food_ids] * (grams / 100.0)[:, None]
+
+    def meal_totals(self, food_ids, grams):
+        # Summed macros of a meal of several portions
+        if not len(food_ids):
+            return dict.fromkeys(NUTRIENTS, 0.0)
+        totals = self.portions(food_ids, grams).sum(axis=0)
+        return {nutrient: float(value) for nutrient, value in zip(NUTRIENTS, totals)}
+
+def load_food_index(csv_path=None, index_dir=None):
+    # Builds the index on first use or when the CSV has changed, then maps it
+    csv_path = csv_path or FOOD_CSV
+    index_dir = index_dir or INDEX_DIR
+    if not _is_current(csv_path, index_dir):
+        build_index(csv_path, index_dir)
+    return FoodIndex(index_dir)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query the local food database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Compile a food CSV into the index")
+    build.add_argument("csv", nargs="?", default=FOOD_CSV)
+    build.add_argument("--index-dir", default=INDEX_DIR)
+    search = subparsers.add_parser("search", help="Look up foods by name")
+    search.add_argument("query")
+    search.add_argument("--limit", type=int, default=10)
+    search.add_argument("--index-dir", default=INDEX_DIR)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        stats = build_index(args.csv, args.index_dir)
+        print(f"Indexed {stats['foods']} foods ({stats['words']} words, {stats['trigrams']} trigrams) "
+              f"in {stats['seconds']:.2f}s")
+        return
+
+    index = load_food_index(index_dir=args.index_dir)
+    started = time.perf_counter()
+    ids = index.search(args.query, args.limit)
+    elapsed = (time.perf_counter() - started) * 1000
+    for food_id in ids:
+        food = index.food(food_id)
+        print(f"{food['name']}: {food['calories']:.0f} kcal, {food['protein']:.1f} g protein, "
+              f"{food['carbs']:.1f} g carbs, {food['fats']:.1f} g fats per 100 g")
+    print(f"{len(ids)} results in {elapsed:.2f} ms")
+
+if __name__ == "__main__":
+    main()
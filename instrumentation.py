@@ -0,0 +1,210 @@
+# instrumentation.py
+# Lightweight timing spans for database queries, LLM calls and page renders.
+# Recent events are kept in bounded buffers and running totals per label are
+# exported as JSON or Prometheus text.
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Seconds the current job waited in the queue before a worker picked it up
+queue_wait = contextvars.ContextVar('queue_wait', default=None)
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+class Metrics:
+    def __init__(self, max_events=500):
+        self.queries = deque(maxlen=max_events)
+        self.llm_calls = deque(maxlen=max_events)
+        self.renders = deque(maxlen=max_events)
+        self._totals = defaultdict(lambda: defaultdict(float))
+        self._lock = threading.Lock()
+
+    def _add(self, events, totals_key, record, sums):
+        with self._lock:
+            events.append(record)
+            totals = self._totals[totals_key]
+            totals['count'] += 1
+            for name, value in sums.items():
+                totals[name] += value or 0
+
+    def record_query(self, source, statement, seconds, rows):
+        self._add(self.queries, ('db', source), {
+            'at': datetime.utcnow().isoformat(),
+            'source': source,
+            'statement': statement,
+            'seconds': seconds,
+            'rows': rows
+        }, {'seconds': seconds, 'rows': rows})
+
+    def record_llm(self, task, model, total_seconds, first_token_seconds=None, prompt_tokens=None,
+                   completion_tokens=None, cache_hit=False, queue_wait_seconds=None):
+        tokens_per_sec = None
+        if completion_tokens and total_seconds:
+            generation_seconds = total_seconds - (first_token_seconds or 0)
+            tokens_per_sec = completion_tokens / (generation_seconds or total_seconds)
+        self._add(self.llm_calls, ('llm', task, model), {
+            'at': datetime.utcnow().isoformat(),
+            'task': task,
+            'model': model,
+            'queue_wait_seconds': queue_wait_seconds,
+            'first_token_seconds': first_token_seconds,
+            'total_seconds': total_seconds,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'tokens_per_sec': tokens_per_sec,
+            'cache_hit': cache_hit
+        }, {
+            'seconds': total_seconds,
+            'first_token_seconds': first_token_seconds,
+            'queue_wait_seconds': queue_wait_seconds,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'cache_hits': 1 if cache_hit else 0
+        })
+
+    def record_render(self, view, seconds):
+        self._add(self.renders, ('render', view), {
+            'at': datetime.utcnow().isoformat(),
+            'view': view,
+            'seconds': seconds
+        }, {'seconds': seconds})
+
+    @contextmanager
+    def render_span(self, view):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_render(view, time.perf_counter() - started)
+
+    def summary(self):
+        with self._lock:
+            queries = list(self.queries)
+            llm_calls = list(self.llm_calls)
+            renders = list(self.renders)
+
+        def grouped(events, key, value):
+            groups = defaultdict(list)
+            for record in events:
+                if record.get(value) is not None:
+                    groups[record[key]].append(record[value])
+            return {name: {
+                'count': len(values),
+                'mean_ms': sum(values) / len(values) * 1000,
+                'p95_ms': _percentile(values, 0.95) * 1000
+            } for name, values in groups.items()}
+
+        return {
+            'queries': grouped(queries, 'source', 'seconds'),
+            'llm': grouped(llm_calls, 'task', 'total_seconds'),
+            'llm_first_token': grouped(llm_calls, 'task', 'first_token_seconds'),
+            'renders': grouped(renders, 'view', 'seconds'),
+            'recent_llm_calls': llm_calls[-20:]
+        }
+
+    def to_json(self):
+        with self._lock:
+            return {
+                'generated_at': datetime.utcnow().isoformat(),
+                'queries': list(self.queries),
+                'llm_calls': list(self.llm_calls),
+                'renders': list(self.renders),
+                'totals': [{'key': list(key), **totals} for key, totals in self._totals.items()]
+            }
+
+    def to_prometheus(self):
+        def labels(**values):
+            return '{' + ','.join(f'{name}="{value}"' for name, value in values.items()) + '}'
+
+        lines = []
+        with self._lock:
+            totals = {key: dict(values) for key, values in self._totals.items()}
+
+        lines.append("# TYPE health_coach_db_query_seconds summary")
+        for key, values in totals.items():
+            if key[0] == 'db':
+                label = labels(source=key[1])
+                lines.append(f"health_coach_db_query_seconds_count{label} {values['count']:.0f}")
+                lines.append(f"health_coach_db_query_seconds_sum{label} {values['seconds']:.6f}")
+                lines.append(f"health_coach_db_query_rows_total{label} {values['rows']:.0f}")
+
+        lines.append("# TYPE health_coach_llm_request_seconds summary")
+        for key, values in totals.items():
+            if key[0] == 'llm':
+                label = labels(task=key[1], model=key[2])
+                lines.append(f"health_coach_llm_request_seconds_count{label} {values['count']:.0f}")
+                lines.append(f"health_coach_llm_request_seconds_sum{label} {values['seconds']:.6f}")
+                lines.append(f"health_coach_llm_first_token_seconds_sum{label} {values['first_token_seconds']:.6f}")
+                lines.append(f"health_coach_llm_queue_wait_seconds_sum{label} {values['queue_wait_seconds']:.6f}")
+                lines.append(f"health_coach_llm_prompt_tokens_total{label} {values['prompt_tokens']:.0f}")
+                lines.append(f"health_coach_llm_completion_tokens_total{label} {values['completion_tokens']:.0f}")
+                lines.append(f"health_coach_llm_cache_hits_total{label} {values['cache_hits']:.0f}")
+
+        lines.append("# TYPE health_coach_render_seconds summary")
+        for key, values in totals.items():
+            if key[0] == 'render':
+                label = labels(view=key[1])
+                lines.append(f"health_coach_render_seconds_count{label} {values['count']:.0f}")
+                lines.append(f"health_coach_render_seconds_sum{label} {values['seconds']:.6f}")
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, directory=None):
+        directory = directory or os.environ.get('HEALTH_COACH_METRICS_DIR', '.')
+        json_path = os.path.join(directory, 'health_coach_metrics.json')
+        prometheus_path = os.path.join(directory, 'health_coach_metrics.prom')
+        with open(json_path, 'w') as f:
+            json.dump(self.to_json(), f, indent=2, default=str)
+        with open(prometheus_path, 'w') as f:
+            f.write(self.to_prometheus())
+        return json_path, prometheus_path
+
+metrics = Metrics()
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _query_source():
+    # First frame in this project's code outside the instrumentation itself
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_PACKAGE_DIR) and not filename.endswith('instrumentation.py'):
+            return f"{os.path.splitext(os.path.basename(filename))[0]}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return 'unknown'
+
+def _on_orm_execute(orm_execute_state):
+    # Times ORM statements and counts returned rows. Streaming queries
+    # (yield_per) are timed up to the first row only, and their rows aren't counted.
+    if orm_execute_state.is_select and not orm_execute_state.execution_options.get('yield_per'):
+        started = time.perf_counter()
+        frozen = orm_execute_state.invoke_statement().freeze()
+        rows = len(frozen.data)
+        result = frozen()
+    else:
+        started = time.perf_counter()
+        result = orm_execute_state.invoke_statement()
+        rows = result.rowcount if not orm_execute_state.is_select and result.rowcount >= 0 else None
+
+    statement = str(orm_execute_state.statement).split('\n', 1)[0][:120]
+    metrics.record_query(_query_source(), statement, time.perf_counter() - started, rows)
+    return result
+
+_installed = False
+
+def install():
+    global _installed
+    if not _installed:
+        event.listen(Session, 'do_orm_execute', _on_orm_execute)
+        _installed = True
\ No newline at end of file
@@ -0,0 +1,153 @@
+# jobs.py
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy.orm import sessionmaker
+from database import User, WorkoutPlan, NutritionPlan, MotivationalText, GenerationJob
+from agents import generate_all
+from instrumentation import queue_wait
+
+JOB_KINDS = ('workout_plan', 'nutrition_plan', 'motivation', 'all')
+ACTIVE_STATUSES = ('pending', 'running')
+# Short generations with their own workers, so they don't wait behind plans
+LIGHT_KINDS = ('motivation',)
+
+# How often partial output of a streaming generation is written back to the job row
+PROGRESS_INTERVAL = 0.5
+
+class JobQueue:
+    # Runs LLM generations on bounded worker pools, one for plans and one for
+    # LIGHT_KINDS. Jobs are persisted in generation_jobs so the UI can poll
+    # them across reruns.
+    def __init__(self, engine, fitness_agent, nutrition_agent, motivational_agent, max_workers=2, light_workers=1):
+        self.Session = sessionmaker(bind=engine)
+        self.fitness_agent = fitness_agent
+        self.nutrition_agent = nutrition_agent
+        self.motivational_agent = motivational_agent
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='llm-job')
+        self.light_executor = ThreadPoolExecutor(max_workers=light_workers, thread_name_prefix='llm-light-job')
+
+    def submit(self, user_id, kind):
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        session = self.Session()
+        try:
+            job = GenerationJob(user_id=user_id, kind=kind, status='pending')
+            session.add(job)
+            session.commit()
+            job_id = job.id
+        finally:
+            session.close()
+
+        self._executor_for(kind).submit(self._run, job_id)
+        return job_id
+
+    def recover(self):
+        # Re-enqueue jobs left behind by a previous process
+        session = self.Session()
+        try:
+            jobs = session.query(GenerationJob).filter(GenerationJob.status.in_(ACTIVE_STATUSES)).all()
+            for job in jobs:
+                job.status = 'pending'
+                job.result = None
+            session.commit()
+            job_ids = [(job.id, job.kind) for job in jobs]
+        finally:
+            session.close()
+
+        for job_id, kind in job_ids:
+            self._executor_for(kind).submit(self._run, job_id)
+        return len(job_ids)
+
+    def status(self, job_id):
+        session = self.Session()
+        try:
+            job = session.get(GenerationJob, job_id)
+            if job is None:
+                return None
+            return {
+                'id': job.id,
+                'kind': job.kind,
+                'status': job.status,
+                'result': job.result,
+                'error': job.error,
+                'created_at': job.created_at,
+                'finished_at': job.finished_at
+            }
+        finally:
+            session.close()
+
+    def pending_count(self):
+        session = self.Session()
+        try:
+            return session.query(GenerationJob).filter(GenerationJob.status.in_(ACTIVE_STATUSES)).count()
+        finally:
+            session.close()
+
+    def shutdown(self, wait=True):
+        self.light_executor.shutdown(wait=wait)
+        self.executor.shutdown(wait=wait)
+
+    def _executor_for(self, kind):
+        return self.light_executor if kind in LIGHT_KINDS else self.executor
+
+    def _run(self, job_id):
+        session = self.Session()
+        try:
+            job = session.get(GenerationJob, job_id)
+            if job is None or job.status != 'pending':
+                return
+            job.status = 'running'
+            job.started_at = datetime.utcnow()
+            session.commit()
+            queue_wait.set((job.started_at - job.created_at).total_seconds())
+
+            if job.kind == 'workout_plan':
+                text = self._stream_into(session, job, self.fitness_agent.stream_fitness_data(job.user_id, session))
+                session.add(WorkoutPlan(user_id=job.user_id, plan_content=text))
+            elif job.kind == 'nutrition_plan':
+                text = self._stream_into(session, job, self.nutrition_agent.stream_nutrition_data(job.user_id, session))
+                session.add(NutritionPlan(user_id=job.user_id, plan_content=text))
+            elif job.kind == 'motivation':
+                user = session.query(User).filter(User.id == job.user_id).first()
+                text = self.motivational_agent.generate_motivational_text(job.user_id, user.fitness_goal, user)
+                session.add(MotivationalText(user_id=job.user_id, text_content=text))
+            else:
+                results = generate_all(job.user_id, session, self.fitness_agent, self.nutrition_agent, self.motivational_agent)
+                session.add(WorkoutPlan(user_id=job.user_id, plan_content=results['workout_plan']))
+                session.add(NutritionPlan(user_id=job.user_id, plan_content=results['nutrition_plan']))
+                session.add(MotivationalText(user_id=job.user_id, text_content=results['motivation']))
+                text = (
+                    f"### Workout Plan\n\n{results['workout_plan']}\n\n"
+                    f"### Nutrition Plan\n\n{results['nutrition_plan']}\n\n"
+                    f"### Motivation\n\n{results['motivation']}"
+                )
+
+            job.result = text
+            job.status = 'done'
+            job.finished_at = datetime.utcnow()
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            job = session.get(GenerationJob, job_id)
+            if job is not None:
+                job.status = 'failed'
+                job.error = str(e)
+                job.finished_at = datetime.utcnow()
+                session.commit()
+        finally:
+            session.close()
+
+    def _stream_into(self, session, job, chunks):
+        # The first chunk is written straight away so it shows on the next poll
+        parts = []
+        last_flush = None
+        for chunk in chunks:
+            parts.append(chunk)
+            if last_flush is None or time.monotonic() - last_flush >= PROGRESS_INTERVAL:
+                job.result = ''.join(parts)
+                session.commit()
+                last_flush = time.monotonic()
+        return ''.join(parts)
\ No newline at end of file
@@ -0,0 +1,235 @@
+# llm_backend.py
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from instrumentation import metrics, queue_wait
+from routing import Router
+
+DEFAULT_KEEP_ALIVE = '30m'
+
+def _messages(system_prompt, prompt):
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt}
+    ]
+
+class OllamaBackend:
+    # Shared Ollama access for all agents: pooled clients per endpoint (the async
+    # ones living on a dedicated event loop thread), the response cache, and a
+    # router choosing the model and endpoint for each request. Passing model=None
+    # lets the router pick the model configured for the task. max_concurrent caps
+    # the model requests in flight across every caller sharing the backend (job
+    # workers, the motivation pool, batched chat_many calls); None leaves them
+    # unbounded.
+    def __init__(self, host=None, keep_alive=None, cache=None, timeout=None, router=None, max_concurrent=None):
+        self.keep_alive = keep_alive or os.environ.get('OLLAMA_KEEP_ALIVE', DEFAULT_KEEP_ALIVE)
+        self.cache = cache
+        self.timeout = timeout
+        if router is None:
+            router = Router([host], timeout=timeout) if host else Router.from_config(timeout)
+        self.router = router
+        self.max_concurrent = max_concurrent
+        self._slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def chat(self, model, system_prompt, prompt, options=None, task=None):
+        started = time.perf_counter()
+        down, checked, error = set(), set(), None
+        for endpoint, name in self.router.candidates(task, model):
+            if endpoint in down:
+                continue
+            key = self._cache_key(name, system_prompt, prompt, options)
+            if key is not None and name not in checked:
+                checked.add(name)
+                cached = self.cache.get(key)
+                if cached is not None:
+                    self._record(task, name, started, cache_hit=True)
+                    return cached
+
+            try:
+                with self._slot(), self.router.use(endpoint):
+                    response = endpoint.client.chat(
+                        model=name,
+                        messages=_messages(system_prompt, prompt),
+                        options=options,
+                        keep_alive=self.keep_alive
+                    )
+            except Exception as e:
+                error = self._fail_over(endpoint, name, e, down)
+                continue
+
+            content = response['message']['content']
+            self._record(task, name, started, response=response)
+            if key is not None:
+                self.cache.set(key, name, content)
+            return content
+        raise error
+
+    def stream_chat(self, model, system_prompt, prompt, options=None, task=None):
+        started = time.perf_counter()
+        down, checked, error = set(), set(), None
+        for endpoint, name in self.router.candidates(task, model):
+            if endpoint in down:
+                continue
+            key = self._cache_key(name, system_prompt, prompt, options)
+            if key is not None and name not in checked:
+                checked.add(name)
+                cached = self.cache.get(key)
+                if cached is not None:
+                    self._record(task, name, started, first_token=time.perf_counter(), cache_hit=True)
+                    yield cached
+                    return
+
+            # Yield the content of each chunk as Ollama produces it. Once output
+            # has been yielded the request can no longer move to another endpoint.
+            parts = []
+            first_token = None
+            final = None
+            try:
+                with self._slot(), self.router.use(endpoint):
+                    for chunk in endpoint.client.chat(
+                        model=name,
+                        messages=_messages(system_prompt, prompt),
+                        options=options,
+                        keep_alive=self.keep_alive,
+                        stream=True
+                    ):
+                        if chunk.get('done'):
+                            final = chunk
+                        content = chunk['message']['content']
+                        if content:
+                            if first_token is None:
+                                first_token = time.perf_counter()
+                            parts.append(content)
+                            yield content
+            except Exception as e:
+                if parts:
+                    raise
+                error = self._fail_over(endpoint, name, e, down)
+                continue
+
+            self._record(task, name, started, first_token=first_token, response=final)
+            # Only complete generations are cached
+            if key is not None:
+                self.cache.set(key, name, ''.join(parts))
+            return
+        raise error
+
+    async def achat(self, model, system_prompt, prompt, options=None, task=None, waited=None, use_cache=True):
+        # use_cache=False neither reads nor stores the response, for one-off generations
+        started = time.perf_counter()
+        down, checked, error = set(), set(), None
+        for endpoint, name in self.router.candidates(task, model):
+            if endpoint in down:
+                continue
+            key = self._cache_key(name, system_prompt, prompt, options) if use_cache else None
+            if key is not None and name not in checked:
+                checked.add(name)
+                cached = await asyncio.to_thread(self.cache.get, key)
+                if cached is not None:
+                    self._record(task, name, started, cache_hit=True, waited=waited)
+                    return cached
+
+            try:
+                async with self._async_slot():
+                    with self.router.use(endpoint):
+                        response = await endpoint.async_client.chat(
+                            model=name,
+                            messages=_messages(system_prompt, prompt),
+                            options=options,
+                            keep_alive=self.keep_alive
+                        )
+            except Exception as e:
+                error = self._fail_over(endpoint, name, e, down)
+                continue
+
+            content = response['message']['content']
+            self._record(task, name, started, response=response, waited=waited)
+            if key is not None:
+                await asyncio.to_thread(self.cache.set, key, name, content)
+            return content
+        raise error
+
+    def chat_many(self, requests, use_cache=True):
+        # Run (model, system_prompt, prompt, task[, options]) requests concurrently.
+        # Results come back in request order; failed requests are returned as exceptions.
+        waited = queue_wait.get()
+
+        async def gather():
+            return await asyncio.gather(
+                *(self.achat(model, system_prompt, prompt, options[0] if options else None, task=task, waited=waited,
+                             use_cache=use_cache)
+                  for model, system_prompt, prompt, task, *options in requests),
+                return_exceptions=True
+            )
+        return self.run(gather())
+
+    def run(self, coro):
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    def close(self):
+        with self._lock:
+            if self._loop is None:
+                return
+            for endpoint in self.router.endpoints:
+                asyncio.run_coroutine_threadsafe(endpoint.aclose(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='ollama-async', daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    @contextmanager
+    def _slot(self):
+        if self._slots is None:
+            yield
+            return
+        with self._slots:
+            yield
+
+    @asynccontextmanager
+    async def _async_slot(self):
+        # The slots are shared with the worker threads, so the event loop waits
+        # for one off-loop rather than blocking
+        if self._slots is None:
+            yield
+            return
+        await asyncio.to_thread(self._slots.acquire)
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    def _fail_over(self, endpoint, model, error, down):
+        # Returns the error when the next candidate should be tried, re-raises it otherwise
+        if not self.router.record_failure(endpoint, model, error):
+            raise error
+        if not endpoint.healthy:
+            down.add(endpoint)
+        return error
+
+    def _record(self, task, model, started, first_token=None, response=None, cache_hit=False, waited=None):
+        metrics.record_llm(
+            task or 'chat',
+            model,
+            time.perf_counter() - started,
+            first_token_seconds=first_token - started if first_token else None,
+            prompt_tokens=response.get('prompt_eval_count') if response else None,
+            completion_tokens=response.get('eval_count') if response else None,
+            cache_hit=cache_hit,
+            queue_wait_seconds=waited if waited is not None else queue_wait.get()
+        )
+
+    def _cache_key(self, model, system_prompt, prompt, options):
+        if self.cache is None:
+            return None
+        return self.cache.make_key(model, system_prompt, prompt, options)
\ No newline at end of file
@@ -0,0 +1,104 @@
+# llm_cache.py
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy.orm import sessionmaker
+from database import LLMCacheEntry
+
+class ResponseCache:
+    # Persistent LLM response cache stored in the app database, with TTL
+    # expiry and LRU eviction once more than max_entries responses are kept
+    def __init__(self, engine, ttl_seconds=24 * 60 * 60, max_entries=500):
+        self.Session = sessionmaker(bind=engine)
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model, system_prompt, prompt, options=None):
+        payload = json.dumps([model, system_prompt, prompt, options or {}], sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        session = self.Session()
+        try:
+            entry = session.get(LLMCacheEntry, key)
+            now = datetime.utcnow()
+            if entry is not None and entry.created_at < now - self.ttl:
+                session.delete(entry)
+                session.commit()
+                entry = None
+            if entry is None:
+                self._count(False)
+                return None
+
+            entry.hit_count = (entry.hit_count or 0) + 1
+            entry.last_accessed = now
+            response = entry.response
+            session.commit()
+            self._count(True)
+            return response
+        finally:
+            session.close()
+
+    def set(self, key, model, response):
+        session = self.Session()
+        try:
+            now = datetime.utcnow()
+            session.merge(LLMCacheEntry(
+                key=key,
+                model=model,
+                response=response,
+                hit_count=0,
+                created_at=now,
+                last_accessed=now
+            ))
+            session.flush()
+            self._evict(session, now)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def _evict(self, session, now):
+        session.query(LLMCacheEntry).filter(
+            LLMCacheEntry.created_at < now - self.ttl
+        ).delete(synchronize_session=False)
+
+        # Drop the least recently used entries beyond the size bound
+        stale_keys = session.query(LLMCacheEntry.key).order_by(
+            LLMCacheEntry.last_accessed.desc()
+        ).offset(self.max_entries).all()
+        if stale_keys:
+            session.query(LLMCacheEntry).filter(
+                LLMCacheEntry.key.in_([key for key, in stale_keys])
+            ).delete(synchronize_session=False)
+
+    def clear(self):
+        session = self.Session()
+        try:
+            session.query(LLMCacheEntry).delete()
+            session.commit()
+        finally:
+            session.close()
+
+    def stats(self):
+        session = self.Session()
+        try:
+            entries = session.query(LLMCacheEntry).count()
+        finally:
+            session.close()
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': entries}
\ No newline at end of file
@@ -0,0 +1,256 @@
+# log_cache.py
+# Process-wide cache of each active user's recent fitness and nutrition logs,
+# held as NumPy columns rather than ORM objects. The dashboard and the coach
+# agents read their aggregates from it, so repeated interactions don't go back
+# to the database. The forms append new logs as they commit them, least
+# recently used users are evicted once the cache outgrows its memory budget,
+# and entries are reloaded after CACHE_TTL so writes from other processes
+# (bulk imports, rollup rebuilds) show up too.
+#
+# Windows reaching further back than CACHE_DAYS fall through to queries.py.
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+import numpy as np
+from database import FitnessLog, NutritionLog
+import queries
+from queries import window_start
+
+CACHE_DAYS = 30
+CACHE_TTL = 600
+DEFAULT_MAX_BYTES = int(float(os.environ.get('HEALTH_COACH_LOG_CACHE_MB', '64')) * 1024 * 1024)
+
+NUTRIENTS = ('calories', 'protein', 'carbs', 'fats')
+
+class _UserLogs:
+    # One user's logs since start_day as parallel arrays in created_at order
+    def __init__(self, start_day, fitness, nutrition):
+        self.start_day = start_day
+        self.fitness = fitness        # created_at, duration, calories_burned, activity (codes into activities)
+        self.nutrition = nutrition    # created_at and one column per nutrient
+        self.loaded_at = time.monotonic()
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in self.fitness.values() if hasattr(column, 'nbytes')) + \
+            sum(column.nbytes for column in self.nutrition.values())
+
+def _fitness_columns(rows, activities=None):
+    activities = list(activities or [])
+    codes = {activity: code for code, activity in enumerate(activities)}
+    activity_codes = []
+    for row in rows:
+        if row[3] not in codes:
+            codes[row[3]] = len(activities)
+            activities.append(row[3])
+        activity_codes.append(codes[row[3]])
+
+    return {
+        'created_at': np.array([row[0] for row in rows], dtype='datetime64[s]'),
+        'duration': np.array([row[1] or 0 for row in rows], dtype=np.int32),
+        'calories_burned': np.array([row[2] or 0 for row in rows], dtype=np.float64),
+        'activity': np.array(activity_codes, dtype=np.int16),
+        'activities': activities
+    }
+
+def _nutrition_columns(rows):
+    columns = {'created_at': np.array([row[0] for row in rows], dtype='datetime64[s]')}
+    for index, name in enumerate(NUTRIENTS, start=1):
+        columns[name] = np.array([row[index] or 0 for row in rows], dtype=np.float64)
+    return columns
+
+def _concat(columns, new_columns):
+    return {name: np.concatenate([columns[name], new_columns[name]]) if name != 'activities' else new_columns[name]
+            for name in columns}
+
+def _mask(created_at, start_day=None, since=None):
+    if since is not None:
+        return created_at > np.datetime64(since, 's')
+    return created_at >= np.datetime64(start_day, 'D')
+
+def _by_day(created_at, mask, columns):
+    # Per-day sums of the masked rows, in the shape queries.py returns for the charts
+    days, inverse = np.unique(created_at[mask].astype('datetime64[D]'), return_inverse=True)
+    result = {'date': [day.item() for day in days]}
+    for name, values in columns.items():
+        result[name] = np.bincount(inverse, weights=values[mask], minlength=len(days)).tolist()
+    return result
+
+class RecentLogCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, days=CACHE_DAYS, ttl=CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.days = days
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, session, user_id, start_day=None, since=None):
+        # The user's entry if it covers the requested range, loading it on a miss;
+        # None when the range starts before the cache window
+        requested = since.date() if since is not None else start_day
+        if isinstance(requested, datetime):
+            requested = requested.date()
+        if requested < window_start(self.days):
+            return None
+
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and time.monotonic() - entry.loaded_at < self.ttl and requested >= entry.start_day:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        entry = self._load(session, user_id)
+        self._put(user_id, entry)
+        return entry
+
+    def _load(self, session, user_id):
+        start_day = window_start(self.days)
+        start = datetime.combine(start_day, datetime.min.time())
+        fitness = session.query(
+            FitnessLog.created_at, FitnessLog.duration, FitnessLog.calories_burned, FitnessLog.activity_type
+        ).filter(FitnessLog.user_id == user_id, FitnessLog.created_at >= start).order_by(FitnessLog.created_at).all()
+        nutrition = session.query(
+            NutritionLog.created_at, *(getattr(NutritionLog, name) for name in NUTRIENTS)
+        ).filter(NutritionLog.user_id == user_id, NutritionLog.created_at >= start).order_by(NutritionLog.created_at).all()
+        return _UserLogs(start_day, _fitness_columns(fitness), _nutrition_columns(nutrition))
+
+    def _put(self, user_id, entry):
+        with self._lock:
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            total = sum(cached.nbytes for cached in self._entries.values())
+            while total > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                total -= evicted.nbytes
+
+    # Write-through from the log forms, called once the new row is committed
+
+    def add_fitness_log(self, log):
+        with self._lock:
+            entry = self._entries.get(log.user_id)
+        if entry is None:
+            return
+        new_columns = _fitness_columns(
+            [(log.created_at, log.duration, log.calories_burned, log.activity_type)],
+            entry.fitness['activities']
+        )
+        updated = _UserLogs(entry.start_day, _concat(entry.fitness, new_columns), entry.nutrition)
+        updated.loaded_at = entry.loaded_at
+        self._put(log.user_id, updated)
+
+    def add_nutrition_log(self, log):
+        with self._lock:
+            entry = self._entries.get(log.user_id)
+        if entry is None:
+            return
+        new_columns = _nutrition_columns([(log.created_at, *(getattr(log, name) for name in NUTRIENTS))])
+        updated = _UserLogs(entry.start_day, entry.fitness, _concat(entry.nutrition, new_columns))
+        updated.loaded_at = entry.loaded_at
+        self._put(log.user_id, updated)
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._entries),
+                'bytes': sum(entry.nbytes for entry in self._entries.values()),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    # Same results as the queries.py functions of the same name
+
+    def fitness_summary(self, session, user_id, start_day):
+        entry = self._get(session, user_id, start_day)
+        if entry is None:
+            return queries.fitness_summary(session, user_id, start_day)
+        mask = _mask(entry.fitness['created_at'], start_day)
+        return self._fitness_totals(entry, mask)
+
+    def fitness_activity_counts(self, session, user_id, start_day):
+        entry = self._get(session, user_id, start_day)
+        if entry is None:
+            return queries.fitness_activity_counts(session, user_id, start_day)
+        mask = _mask(entry.fitness['created_at'], start_day)
+        return self._activity_counts(entry, mask)
+
+    def fitness_daily(self, session, user_id, start_day):
+        entry = self._get(session, user_id, start_day)
+        if entry is None:
+            return queries.fitness_daily(session, user_id, start_day)
+        fitness = entry.fitness
+        daily = _by_day(fitness['created_at'], _mask(fitness['created_at'], start_day), {
+            'duration': fitness['duration'],
+            'calories_burned': fitness['calories_burned']
+        })
+        daily['duration'] = [int(value) for value in daily['duration']]
+        return daily
+
+    def fitness_since(self, session, user_id, since):
+        entry = self._get(session, user_id, since=since)
+        if entry is None:
+            return queries.fitness_since(session, user_id, since)
+        mask = _mask(entry.fitness['created_at'], since=since)
+        totals = self._fitness_totals(entry, mask)
+        return {
+            'total_duration': totals['total_duration'],
+            'total_calories': totals['total_calories'],
+            'sessions': totals['sessions'],
+            'activities': self._activity_counts(entry, mask)
+        }
+
+    def nutrition_summary(self, session, user_id, start_day):
+        entry = self._get(session, user_id, start_day)
+        if entry is None:
+            return queries.nutrition_summary(session, user_id, start_day)
+        return self._nutrition_totals(entry, _mask(entry.nutrition['created_at'], start_day))
+
+    def nutrition_daily(self, session, user_id, start_day):
+        entry = self._get(session, user_id, start_day)
+        if entry is None:
+            return queries.nutrition_daily(session, user_id, start_day)
+        nutrition = entry.nutrition
+        return _by_day(nutrition['created_at'], _mask(nutrition['created_at'], start_day),
+                       {name: nutrition[name] for name in NUTRIENTS})
+
+    def nutrition_since(self, session, user_id, since):
+        entry = self._get(session, user_id, since=since)
+        if entry is None:
+            return queries.nutrition_since(session, user_id, since)
+        return self._nutrition_totals(entry, _mask(entry.nutrition['created_at'], since=since))
+
+    def _fitness_totals(self, entry, mask):
+        sessions = int(mask.sum())
+        total_duration = int(entry.fitness['duration'][mask].sum(dtype='int64'))
+        return {
+            'total_duration': total_duration,
+            'total_calories': float(entry.fitness['calories_burned'][mask].sum(dtype='float64')),
+            'sessions': sessions,
+            'avg_duration': total_duration / sessions if sessions else 0
+        }
+
+    def _activity_counts(self, entry, mask):
+        activities = entry.fitness['activities']
+        counts = np.bincount(entry.fitness['activity'][mask], minlength=len(activities))
+        # Most frequent first, ties by name, as in queries.py
+        return sorted(((activities[code], int(count)) for code, count in enumerate(counts) if count),
+                      key=lambda item: (-item[1], item[0]))
+
+    def _nutrition_totals(self, entry, mask):
+        totals = {f'total_{name}': float(entry.nutrition[name][mask].sum(dtype='float64')) for name in NUTRIENTS}
+        totals['meals'] = int(mask.sum())
+        return totals
+
+recent_logs = RecentLogCache()
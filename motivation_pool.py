@@ -0,0 +1,194 @@
+# motivation_pool.py
+# Pre-generated motivational messages, bucketed by fitness goal and a coarse
+# profile band (age and BMI ranges). The button serves a message the user
+# hasn't seen yet straight from the database. A background worker tops up
+# buckets that run low (only back to the low-water mark at peak times) and
+# fills every bucket in use during off-peak hours.
+#
+# Off-peak hours are local, "start-end" with the end excluded:
+#   HEALTH_COACH_POOL_OFF_PEAK=1-6
+import logging
+import os
+import random
+import threading
+from datetime import datetime
+from sqlalchemy import func, select
+from database import session_scope, User, MotivationalText, MotivationPoolEntry, MotivationServed
+
+logger = logging.getLogger(__name__)
+
+POOL_TARGET_SIZE = 10     # unseen messages per user a refill aims for
+POOL_LOW_WATER = 3        # unseen messages left when a bucket is topped up
+POOL_MAX_SIZE = 200       # oldest messages beyond this are dropped from a bucket
+POOL_BATCH_SIZE = 5       # generations sent to the model concurrently off-peak
+POOL_PEAK_BATCH_SIZE = 1  # low-water refills outside off-peak hours go one at a time
+REFILL_CHECK_INTERVAL = 300
+DEFAULT_OFF_PEAK = '1-6'
+
+# Rotated through the prompts so messages in a bucket don't all read alike
+THEMES = [
+    'consistency', 'small wins', 'rest and recovery', 'building habits',
+    'progress over perfection', 'the next workout', 'energy and mood', 'long-term health'
+]
+
+def _age_band(age):
+    if not age:
+        return 'any age'
+    if age < 30:
+        return 'under 30'
+    return '30-49' if age < 50 else '50 and over'
+
+def _bmi_band(weight, height):
+    if not weight or not height:
+        return 'any build'
+    bmi = weight / (height / 100) ** 2
+    if bmi < 25:
+        return 'BMI under 25'
+    return 'BMI 25-30' if bmi < 30 else 'BMI over 30'
+
+def bucket_for(fitness_goal, age, weight, height):
+    return '|'.join((fitness_goal or 'General Fitness', _age_band(age), _bmi_band(weight, height)))
+
+def _off_peak_hours(spec):
+    start, end = (int(hour) for hour in spec.split('-'))
+    return set(range(start, end)) if start <= end else set(range(start, 24)) | set(range(0, end))
+
+class MotivationPool:
+    def __init__(self, engine, agent, target_size=POOL_TARGET_SIZE, low_water=POOL_LOW_WATER, off_peak=None):
+        self.engine = engine
+        self.agent = agent
+        self.target_size = target_size
+        self.low_water = low_water
+        self.off_peak_hours = _off_peak_hours(off_peak or os.environ.get('HEALTH_COACH_POOL_OFF_PEAK', DEFAULT_OFF_PEAK))
+        self._pending = {}  # bucket -> unseen messages its user had left
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._last_fill = None
+
+    def take(self, user):
+        # Serves an unseen message from the user's bucket and records it in their
+        # history, or returns None when the bucket has nothing new for them
+        bucket = bucket_for(user.fitness_goal, user.age, user.weight, user.height)
+        with session_scope(self.engine) as session:
+            served = select(MotivationServed.entry_id).where(MotivationServed.user_id == user.id)
+            unseen = session.query(MotivationPoolEntry).filter(
+                MotivationPoolEntry.bucket == bucket,
+                MotivationPoolEntry.id.not_in(served)
+            ).order_by(MotivationPoolEntry.id).limit(self.low_water + 1).all()
+
+            text = None
+            if unseen:
+                entry = random.choice(unseen)
+                text = entry.text_content
+                session.add(MotivationServed(user_id=user.id, entry_id=entry.id))
+                session.add(MotivationalText(user_id=user.id, text_content=text))
+
+        remaining = len(unseen) - (1 if text is not None else 0)
+        if remaining < self.low_water:
+            self.request_refill(bucket, remaining)
+        return text
+
+    def request_refill(self, bucket, remaining):
+        with self._lock:
+            self._pending[bucket] = min(remaining, self._pending.get(bucket, remaining))
+        self._wake.set()
+
+    def refill(self, bucket, count, batch_size=POOL_BATCH_SIZE):
+        # Generates `count` messages for the bucket, batch_size at a time
+        fitness_goal, age_band, bmi_band = bucket.split('|')
+        agent = self.agent
+        added = 0
+        for start in range(0, count, batch_size):
+            # Every message is meant to be different, so the response cache is
+            # bypassed rather than filled with entries that are never hit again
+            results = agent.backend.chat_many([
+                (agent.model, agent.system_prompt,
+                 agent.build_pool_prompt(fitness_goal, age_band, bmi_band, random.choice(THEMES)),
+                 agent.task, {'temperature': 0.9})
+                for _ in range(min(batch_size, count - start))
+            ], use_cache=False)
+            texts = [text.strip() for text in results if not isinstance(text, Exception) and text.strip()]
+            if not texts:
+                break
+
+            with session_scope(self.engine) as session:
+                session.add_all(MotivationPoolEntry(bucket=bucket, text_content=text) for text in texts)
+                session.flush()
+                self._trim(session, bucket)
+            added += len(texts)
+        return added
+
+    def fill(self):
+        # Tops up every bucket in use so that each of its users has target_size unseen messages
+        with session_scope(self.engine) as session:
+            sizes = dict(session.query(MotivationPoolEntry.bucket, func.count(MotivationPoolEntry.id))
+                         .group_by(MotivationPoolEntry.bucket).all())
+            seen = {(user_id, bucket): count for user_id, bucket, count in session.query(
+                MotivationServed.user_id, MotivationPoolEntry.bucket, func.count()
+            ).join(MotivationPoolEntry, MotivationPoolEntry.id == MotivationServed.entry_id).group_by(
+                MotivationServed.user_id, MotivationPoolEntry.bucket
+            )}
+            needed = {}
+            for user_id, goal, age, weight, height in session.query(
+                User.id, User.fitness_goal, User.age, User.weight, User.height
+            ):
+                bucket = bucket_for(goal, age, weight, height)
+                unseen = sizes.get(bucket, 0) - seen.get((user_id, bucket), 0)
+                needed[bucket] = max(needed.get(bucket, 0), self.target_size - unseen)
+
+        return sum(self.refill(bucket, count) for bucket, count in needed.items() if count > 0)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._work, name='motivation-pool', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def stats(self):
+        with session_scope(self.engine) as session:
+            entries, buckets = session.query(
+                func.count(MotivationPoolEntry.id),
+                func.count(func.distinct(MotivationPoolEntry.bucket))
+            ).one()
+        with self._lock:
+            pending = len(self._pending)
+        return {'entries': entries, 'buckets': buckets, 'pending_refills': pending}
+
+    def _work(self):
+        while not self._stopped.is_set():
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            try:
+                # At peak times a bucket only gets back to low_water, one request
+                # at a time next to the interactive jobs; the off-peak fill()
+                # brings it up to target_size
+                now = datetime.now()
+                off_peak = now.hour in self.off_peak_hours
+                target = self.target_size if off_peak else self.low_water
+                batch_size = POOL_BATCH_SIZE if off_peak else POOL_PEAK_BATCH_SIZE
+                for bucket, remaining in pending.items():
+                    if target > remaining:
+                        self.refill(bucket, target - remaining, batch_size)
+
+                if off_peak and self._last_fill != now.date():
+                    self.fill()
+                    self._last_fill = now.date()
+            except Exception:
+                # Ollama may be down; buckets are requested again on the next miss
+                logger.exception("Motivation pool refill failed")
+            self._wake.wait(REFILL_CHECK_INTERVAL)
+            self._wake.clear()
+
+    def _trim(self, session, bucket):
+        oldest = [entry_id for entry_id, in session.query(MotivationPoolEntry.id).filter(
+            MotivationPoolEntry.bucket == bucket
+        ).order_by(MotivationPoolEntry.id.desc()).offset(POOL_MAX_SIZE)]
+        if oldest:
+            session.query(MotivationServed).filter(MotivationServed.entry_id.in_(oldest)).delete(synchronize_session=False)
+            session.query(MotivationPoolEntry).filter(MotivationPoolEntry.id.in_(oldest)).delete(synchronize_session=False)
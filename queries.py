@@ -0,0 +1,231 @@
+# queries.py
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, or_, and_
+from database import DailyFitnessRollup, DailyActivityRollup, DailyNutritionRollup, FitnessLog, NutritionLog
+
+# Dashboard and agent aggregates read the daily rollup tables maintained by
+# rollups.py, so a window costs at most one row per day.
+
+def window_start(days):
+    # First day of a window of `days` calendar days ending today; log days are UTC
+    return datetime.utcnow().date() - timedelta(days=days - 1)
+
+def _day(value):
+    if isinstance(value, datetime):
+        return value.date()
+    # SQLite may hand back ISO strings
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+def _columns(rows, names):
+    # Per-day rows as {'date': [...], column: [...]} for the chart builders
+    columns = {name: list(values) for name, values in zip(names, zip(*rows))} if rows else {name: [] for name in names}
+    columns['date'] = [_day(value) for value in columns['date']]
+    return columns
+
+def fitness_summary(session, user_id, start_day):
+    total_duration, total_calories, sessions = session.query(
+        func.coalesce(func.sum(DailyFitnessRollup.duration), 0),
+        func.coalesce(func.sum(DailyFitnessRollup.calories_burned), 0),
+        func.coalesce(func.sum(DailyFitnessRollup.sessions), 0)
+    ).filter(
+        DailyFitnessRollup.user_id == user_id,
+        DailyFitnessRollup.day >= _day(start_day)
+    ).one()
+
+    return {
+        'total_duration': total_duration,
+        'total_calories': total_calories,
+        'sessions': sessions,
+        'avg_duration': total_duration / sessions if sessions else 0
+    }
+
+def fitness_activity_counts(session, user_id, start_day):
+    sessions = func.sum(DailyActivityRollup.sessions)
+    rows = session.query(
+        DailyActivityRollup.activity_type,
+        sessions
+    ).filter(
+        DailyActivityRollup.user_id == user_id,
+        DailyActivityRollup.day >= _day(start_day)
+    ).group_by(DailyActivityRollup.activity_type).order_by(sessions.desc(), DailyActivityRollup.activity_type).all()
+
+    return [(activity, count) for activity, count in rows]
+
+def fitness_daily(session, user_id, start_day):
+    rows = session.query(
+        DailyFitnessRollup.day,
+        DailyFitnessRollup.duration,
+        DailyFitnessRollup.calories_burned
+    ).filter(
+        DailyFitnessRollup.user_id == user_id,
+        DailyFitnessRollup.day >= _day(start_day)
+    ).order_by(DailyFitnessRollup.day).all()
+
+    return _columns(rows, ['date', 'duration', 'calories_burned'])
+
+def nutrition_summary(session, user_id, start_day):
+    total_calories, total_protein, total_carbs, total_fats, meals = session.query(
+        func.coalesce(func.sum(DailyNutritionRollup.calories), 0),
+        func.coalesce(func.sum(DailyNutritionRollup.protein), 0),
+        func.coalesce(func.sum(DailyNutritionRollup.carbs), 0),
+        func.coalesce(func.sum(DailyNutritionRollup.fats), 0),
+        func.coalesce(func.sum(DailyNutritionRollup.meals), 0)
+    ).filter(
+        DailyNutritionRollup.user_id == user_id,
+        DailyNutritionRollup.day >= _day(start_day)
+    ).one()
+
+    return {
+        'total_calories': total_calories,
+        'total_protein': total_protein,
+        'total_carbs': total_carbs,
+        'total_fats': total_fats,
+        'meals': meals
+    }
+
+def nutrition_daily(session, user_id, start_day):
+    rows = session.query(
+        DailyNutritionRollup.day,
+        DailyNutritionRollup.calories,
+        DailyNutritionRollup.protein,
+        DailyNutritionRollup.carbs,
+        DailyNutritionRollup.fats
+    ).filter(
+        DailyNutritionRollup.user_id == user_id,
+        DailyNutritionRollup.day >= _day(start_day)
+    ).order_by(DailyNutritionRollup.day).all()
+
+    return _columns(rows, ['date', 'calories', 'protein', 'carbs', 'fats'])
+
+# The same aggregates for many users at once, one query per table, keyed by user id
+
+def fitness_summaries(session, start_day):
+    rows = session.query(
+        DailyFitnessRollup.user_id,
+        func.sum(DailyFitnessRollup.duration),
+        func.sum(DailyFitnessRollup.calories_burned),
+        func.sum(DailyFitnessRollup.sessions)
+    ).filter(DailyFitnessRollup.day >= _day(start_day)).group_by(DailyFitnessRollup.user_id)
+
+    return {user_id: {
+        'total_duration': total_duration,
+        'total_calories': total_calories,
+        'sessions': sessions,
+        'avg_duration': total_duration / sessions if sessions else 0
+    } for user_id, total_duration, total_calories, sessions in rows}
+
+def fitness_activity_counts_by_user(session, start_day):
+    sessions = func.sum(DailyActivityRollup.sessions)
+    rows = session.query(
+        DailyActivityRollup.user_id,
+        DailyActivityRollup.activity_type,
+        sessions
+    ).filter(
+        DailyActivityRollup.day >= _day(start_day)
+    ).group_by(DailyActivityRollup.user_id, DailyActivityRollup.activity_type).order_by(
+        DailyActivityRollup.user_id, sessions.desc(), DailyActivityRollup.activity_type
+    )
+
+    counts = {}
+    for user_id, activity, count in rows:
+        counts.setdefault(user_id, []).append((activity, count))
+    return counts
+
+def nutrition_summaries(session, start_day):
+    rows = session.query(
+        DailyNutritionRollup.user_id,
+        func.sum(DailyNutritionRollup.calories),
+        func.sum(DailyNutritionRollup.protein),
+        func.sum(DailyNutritionRollup.carbs),
+        func.sum(DailyNutritionRollup.fats),
+        func.sum(DailyNutritionRollup.meals)
+    ).filter(DailyNutritionRollup.day >= _day(start_day)).group_by(DailyNutritionRollup.user_id)
+
+    return {user_id: {
+        'total_calories': total_calories,
+        'total_protein': total_protein,
+        'total_carbs': total_carbs,
+        'total_fats': total_fats,
+        'meals': meals
+    } for user_id, total_calories, total_protein, total_carbs, total_fats, meals in rows}
+
+def latest_timestamps(session, model):
+    # user id -> newest created_at (logs) or generated_at (plans)
+    timestamp = model.created_at if hasattr(model, 'created_at') else model.generated_at
+    return dict(session.query(model.user_id, func.max(timestamp)).group_by(model.user_id).all())
+
+def latest_plan(session, model, user_id):
+    # Most recent WorkoutPlan/NutritionPlan row for the user, or None
+    return session.query(model).filter(model.user_id == user_id).order_by(
+        model.generated_at.desc(), model.id.desc()
+    ).first()
+
+# Deltas since a point in time (e.g. the previous plan) read the raw logs, as
+# the rollups only have whole days
+
+def fitness_since(session, user_id, since):
+    total_duration, total_calories, sessions = session.query(
+        func.coalesce(func.sum(FitnessLog.duration), 0),
+        func.coalesce(func.sum(FitnessLog.calories_burned), 0),
+        func.count(FitnessLog.id)
+    ).filter(
+        FitnessLog.user_id == user_id,
+        FitnessLog.created_at > since
+    ).one()
+
+    count = func.count(FitnessLog.id)
+    activities = session.query(FitnessLog.activity_type, count).filter(
+        FitnessLog.user_id == user_id,
+        FitnessLog.created_at > since
+    ).group_by(FitnessLog.activity_type).order_by(count.desc(), FitnessLog.activity_type).all()
+
+    return {
+        'total_duration': total_duration,
+        'total_calories': total_calories,
+        'sessions': sessions,
+        'activities': [(activity, count) for activity, count in activities]
+    }
+
+def nutrition_since(session, user_id, since):
+    total_calories, total_protein, total_carbs, total_fats, meals = session.query(
+        func.coalesce(func.sum(NutritionLog.calories), 0),
+        func.coalesce(func.sum(NutritionLog.protein), 0),
+        func.coalesce(func.sum(NutritionLog.carbs), 0),
+        func.coalesce(func.sum(NutritionLog.fats), 0),
+        func.count(NutritionLog.id)
+    ).filter(
+        NutritionLog.user_id == user_id,
+        NutritionLog.created_at > since
+    ).one()
+
+    return {
+        'total_calories': total_calories,
+        'total_protein': total_protein,
+        'total_carbs': total_carbs,
+        'total_fats': total_fats,
+        'meals': meals
+    }
+
+def history_page(session, model, user_id, page_size=20, cursor=None, start_date=None, end_date=None):
+    # Keyset pagination over (timestamp, id), newest first. Returns the page
+    # and the cursor for the next one, or None when there are no older rows.
+    timestamp = model.created_at if hasattr(model, 'created_at') else model.generated_at
+
+    query = session.query(model).filter(model.user_id == user_id)
+    if start_date is not None:
+        query = query.filter(timestamp >= start_date)
+    if end_date is not None:
+        query = query.filter(timestamp < end_date)
+    if cursor is not None:
+        cursor_timestamp, cursor_id = cursor
+        query = query.filter(or_(
+            timestamp < cursor_timestamp,
+            and_(timestamp == cursor_timestamp, model.id < cursor_id)
+        ))
+
+    rows = query.order_by(timestamp.desc(), model.id.desc()).limit(page_size + 1).all()
+    if len(rows) <= page_size:
+        return rows, None
+
+    last = rows[page_size - 1]
+    return rows[:page_size], (getattr(last, timestamp.key), last.id)
@@ -0,0 +1,126 @@
+# rollups.py
+# Per-user daily totals for fitness and nutrition, maintained incrementally as
+# logs are inserted. Rebuild from the raw logs with:
+#
+#   python rollups.py rebuild [--user-id N]
+import argparse
+from datetime import datetime
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from database import (
+    session_scope, FitnessLog, NutritionLog,
+    DailyFitnessRollup, DailyActivityRollup, DailyNutritionRollup
+)
+
+ROLLUP_MODELS = (DailyFitnessRollup, DailyActivityRollup, DailyNutritionRollup)
+
+# Dialects whose insert supports ON CONFLICT DO UPDATE
+_CONFLICT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+def _upsert(session, model, keys, increments):
+    # Adds `increments` to the row for `keys`, creating it if missing, in one
+    # statement for the database behind HEALTH_COACH_DB_URL
+    table = model.__table__
+    dialect = session.get_bind().dialect.name
+    if dialect in _CONFLICT_INSERTS:
+        stmt = _CONFLICT_INSERTS[dialect](table).values(**keys, **increments)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={name: table.c[name] + stmt.excluded[name] for name in increments}
+        )
+    elif dialect in ('mysql', 'mariadb'):
+        stmt = mysql.insert(table).values(**keys, **increments)
+        stmt = stmt.on_duplicate_key_update({name: table.c[name] + stmt.inserted[name] for name in increments})
+    else:
+        raise NotImplementedError(f"Rollup upserts are not supported on {dialect}")
+    session.execute(stmt)
+
+def record_fitness_log(session, log):
+    # Call in the same transaction that inserts the log
+    day = (log.created_at or datetime.utcnow()).date()
+    _upsert(session, DailyFitnessRollup, {'user_id': log.user_id, 'day': day}, {
+        'duration': log.duration or 0,
+        'calories_burned': log.calories_burned or 0,
+        'sessions': 1
+    })
+    _upsert(session, DailyActivityRollup, {'user_id': log.user_id, 'day': day, 'activity_type': log.activity_type}, {
+        'sessions': 1
+    })
+
+def record_nutrition_log(session, log):
+    day = (log.created_at or datetime.utcnow()).date()
+    _upsert(session, DailyNutritionRollup, {'user_id': log.user_id, 'day': day}, {
+        'calories': log.calories or 0,
+        'protein': log.protein or 0,
+        'carbs': log.carbs or 0,
+        'fats': log.fats or 0,
+        'meals': 1
+    })
+
+def rebuild_rollups(session, user_id=None):
+    for model in ROLLUP_MODELS:
+        query = session.query(model)
+        if user_id is not None:
+            query = query.filter(model.user_id == user_id)
+        query.delete(synchronize_session=False)
+
+    def grouped(log_model, *columns, extra_group=()):
+        day = func.date(log_model.created_at)
+        stmt = select(log_model.user_id, day, *columns).group_by(log_model.user_id, day, *extra_group)
+        if user_id is not None:
+            stmt = stmt.where(log_model.user_id == user_id)
+        return stmt
+
+    session.execute(insert(DailyFitnessRollup).from_select(
+        ['user_id', 'day', 'duration', 'calories_burned', 'sessions'],
+        grouped(
+            FitnessLog,
+            func.coalesce(func.sum(FitnessLog.duration), 0),
+            func.coalesce(func.sum(FitnessLog.calories_burned), 0),
+            func.count(FitnessLog.id)
+        )
+    ))
+    session.execute(insert(DailyActivityRollup).from_select(
+        ['user_id', 'day', 'activity_type', 'sessions'],
+        grouped(
+            FitnessLog,
+            FitnessLog.activity_type,
+            func.count(FitnessLog.id),
+            extra_group=(FitnessLog.activity_type,)
+        )
+    ))
+    session.execute(insert(DailyNutritionRollup).from_select(
+        ['user_id', 'day', 'calories', 'protein', 'carbs', 'fats', 'meals'],
+        grouped(
+            NutritionLog,
+            func.coalesce(func.sum(NutritionLog.calories), 0),
+            func.coalesce(func.sum(NutritionLog.protein), 0),
+            func.coalesce(func.sum(NutritionLog.carbs), 0),
+            func.coalesce(func.sum(NutritionLog.fats), 0),
+            func.count(NutritionLog.id)
+        )
+    ))
+
+def ensure_rollups(session):
+    # Backfill databases created before the rollup tables existed
+    has_rollups = session.query(DailyFitnessRollup.user_id).first() or session.query(DailyNutritionRollup.user_id).first()
+    has_logs = session.query(FitnessLog.id).first() or session.query(NutritionLog.id).first()
+    if has_logs and not has_rollups:
+        rebuild_rollups(session)
+        return True
+    return False
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain daily fitness and nutrition rollups")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rebuild = subparsers.add_parser("rebuild", help="Recompute rollups from the raw logs")
+    rebuild.add_argument("--user-id", type=int, help="Only rebuild this user's rollups")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        with session_scope() as session:
+            rebuild_rollups(session, args.user_id)
+        print("Rollups rebuilt" + (f" for user {args.user_id}" if args.user_id else ""))
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,184 @@
+# routing.py
+# Chooses a model and an Ollama endpoint for each request. Models are picked
+# per task, endpoints by fewest outstanding requests, and requests fall back to
+# the next endpoint (or model) when one is down, overloaded or missing the model.
+#
+# Configuration comes from the JSON file named by HEALTH_COACH_LLM_CONFIG:
+#
+#   {"hosts": ["http://gpu1:11434", "http://gpu2:11434"],
+#    "routes": {"motivation": ["llama3.2:1b", "llama3"], "default": ["llama3"]},
+#    "max_outstanding": 4}
+#
+# or from OLLAMA_HOSTS (comma separated) / OLLAMA_HOST when there is no file.
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_ROUTES = {
+    'motivation': ['llama3.2:1b', 'llama3'],
+    'default': ['llama3']
+}
+DEFAULT_MAX_OUTSTANDING = 4
+HEALTH_CHECK_INTERVAL = 30
+HEALTH_CHECK_TIMEOUT = 2
+# Seconds a request may wait for a response (or, streaming, for the next chunk)
+# before failing over; connecting gets much less
+DEFAULT_TIMEOUT = float(os.environ.get('HEALTH_COACH_LLM_TIMEOUT', '120'))
+CONNECT_TIMEOUT = 5
+
+class Endpoint:
+    def __init__(self, host=None, timeout=None):
+        self.host = host
+        self.timeout = timeout if timeout is not None else DEFAULT_TIMEOUT
+        self.outstanding = 0
+        self.healthy = True
+        self.models = None  # names reported by /api/tags, None until checked
+        self.missing_models = set()
+        self.last_error = None
+        self.last_check = None
+        self._client = None
+        self._async_client = None
+
+    @property
+    def label(self):
+        return self.host or 'default'
+
+    @property
+    def client(self):
+        if self._client is None:
+            import ollama
+            self._client = ollama.Client(host=self.host, timeout=self._httpx_timeout())
+        return self._client
+
+    @property
+    def async_client(self):
+        # Must first be used from the backend's event loop so its pool stays bound there
+        if self._async_client is None:
+            import ollama
+            self._async_client = ollama.AsyncClient(host=self.host, timeout=self._httpx_timeout())
+        return self._async_client
+
+    def _httpx_timeout(self):
+        import httpx
+        return httpx.Timeout(self.timeout, connect=min(CONNECT_TIMEOUT, self.timeout))
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client._client.aclose()
+            self._async_client = None
+
+    def has_model(self, model):
+        if model in self.missing_models:
+            return False
+        if self.models is None:
+            return True
+        return model in self.models or f"{model}:latest" in self.models
+
+class Router:
+    def __init__(self, hosts=None, routes=None, max_outstanding=DEFAULT_MAX_OUTSTANDING, timeout=None):
+        self.endpoints = [Endpoint(host, timeout) for host in (hosts or [None])]
+        self.routes = {**DEFAULT_ROUTES, **(routes or {})}
+        self.max_outstanding = max_outstanding
+        self._lock = threading.Lock()
+        self._health_thread = None
+
+    @classmethod
+    def from_config(cls, timeout=None):
+        config = {}
+        path = os.environ.get('HEALTH_COACH_LLM_CONFIG')
+        if path:
+            with open(path) as f:
+                config = json.load(f)
+
+        hosts = config.get('hosts')
+        if not hosts and os.environ.get('OLLAMA_HOSTS'):
+            hosts = [host.strip() for host in os.environ['OLLAMA_HOSTS'].split(',') if host.strip()]
+        if not hosts:
+            hosts = [os.environ.get('OLLAMA_HOST')]
+        return cls(hosts, config.get('routes'), config.get('max_outstanding', DEFAULT_MAX_OUTSTANDING), timeout)
+
+    def candidates(self, task=None, model=None):
+        # (endpoint, model) pairs in order of preference: healthy endpoints
+        # first, then the task's preferred model, then endpoints that aren't
+        # overloaded, then fewest outstanding requests
+        models = [model] if model else self.routes.get(task) or self.routes['default']
+        with self._lock:
+            pairs = sorted(
+                ((endpoint, name) for endpoint in self.endpoints for name in models if endpoint.has_model(name)),
+                key=lambda pair: (
+                    not pair[0].healthy,
+                    models.index(pair[1]),
+                    pair[0].outstanding >= self.max_outstanding,
+                    pair[0].outstanding
+                )
+            )
+        # With the model missing everywhere, still try the preferred one so the error surfaces
+        return pairs or [(self.endpoints[0], models[0])]
+
+    @contextmanager
+    def use(self, endpoint):
+        with self._lock:
+            endpoint.outstanding += 1
+        try:
+            yield endpoint
+        finally:
+            with self._lock:
+                endpoint.outstanding -= 1
+
+    def record_failure(self, endpoint, model, error):
+        # Returns True when another candidate should be tried
+        status = getattr(error, 'status_code', None)
+        endpoint.last_error = str(error)
+        if status == 404:
+            endpoint.missing_models.add(model)
+            return True
+        if (status is None and _is_connection_error(error)) or status in (429, 500, 502, 503, 504):
+            endpoint.healthy = False
+            return True
+        return False
+
+    def check_health(self):
+        import httpx
+
+        for endpoint in self.endpoints:
+            url = (endpoint.host or os.environ.get('OLLAMA_HOST') or 'http://127.0.0.1:11434').rstrip('/')
+            if '://' not in url:
+                url = f"http://{url}"
+            try:
+                response = httpx.get(f"{url}/api/tags", timeout=HEALTH_CHECK_TIMEOUT)
+                response.raise_for_status()
+                endpoint.models = {model['name'] for model in response.json().get('models', [])}
+                endpoint.missing_models.clear()
+                endpoint.healthy = True
+                endpoint.last_error = None
+            except Exception as e:
+                endpoint.healthy = False
+                endpoint.last_error = str(e)
+            endpoint.last_check = time.time()
+
+    def start_health_checks(self, interval=HEALTH_CHECK_INTERVAL):
+        if self._health_thread is not None:
+            return
+
+        def loop():
+            while True:
+                self.check_health()
+                time.sleep(interval)
+
+        self._health_thread = threading.Thread(target=loop, name='ollama-health', daemon=True)
+        self._health_thread.start()
+
+    def status(self):
+        return [{
+            'host': endpoint.label,
+            'healthy': endpoint.healthy,
+            'outstanding': endpoint.outstanding,
+            'models': ', '.join(sorted(endpoint.models)) if endpoint.models is not None else 'unknown',
+            'last_error': endpoint.last_error
+        } for endpoint in self.endpoints]
+
+def _is_connection_error(error):
+    import httpx
+    return isinstance(error, (ConnectionError, TimeoutError, httpx.TransportError))
\ No newline at end of file
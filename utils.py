@@ -1,27 +1,90 @@
 # utils.py
-import plotly.express as px
-import pandas as pd
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
 
-def create_fitness_chart(fitness_data):
-    df = pd.DataFrame(fitness_data)
-    if df.empty:
-        return None
-    fig = px.line(df, x='date', y='duration', title='Exercise Duration Over Time')
-    return fig
+# pandas and plotly are imported inside the builders so that importing this
+# module (and app.py) stays cheap until a chart is actually drawn
+
+# Built figures keyed by the caller's cache key, e.g. (user, window, data version)
+FIGURE_CACHE_SIZE = 128
+_figure_cache = OrderedDict()
+_figure_cache_lock = threading.Lock()
+
+def _daily_frame(data, value_columns):
+    # Columnar input ({'date': [...], column: [...]}) summed per calendar day,
+    # with days without entries filled in as zero
+    import pandas as pd
 
-def create_nutrition_chart(nutrition_data):
-    df = pd.DataFrame(nutrition_data)
+    if callable(data):
+        data = data()
+    df = pd.DataFrame(data, columns=['date', *value_columns])
     if df.empty:
         return None
-    fig = px.bar(df, x='date', y='calories', title='Daily Calorie Intake')
+    df['date'] = pd.to_datetime(df['date']).dt.normalize()
+    return df.set_index('date')[value_columns].resample('D').sum().reset_index()
+
+def _cached_figure(cache_key, build):
+    if cache_key is None:
+        return build()
+
+    with _figure_cache_lock:
+        if cache_key in _figure_cache:
+            _figure_cache.move_to_end(cache_key)
+            return _figure_cache[cache_key]
+
+    fig = build()
+    with _figure_cache_lock:
+        _figure_cache[cache_key] = fig
+        while len(_figure_cache) > FIGURE_CACHE_SIZE:
+            _figure_cache.popitem(last=False)
     return fig
 
-def create_macronutrient_chart(nutrition_data):
-    df = pd.DataFrame(nutrition_data)
-    if df.empty:
-        return None
-    fig = px.line(df, x='date', y=['protein', 'carbs', 'fats'], 
-                  title='Macronutrient Intake Over Time',
-                  labels={'value': 'Grams', 'variable': 'Macronutrient'})
-    return fig
\ No newline at end of file
+# The chart builders accept the data itself or a zero-argument callable that
+# returns it, so the data is only loaded when cache_key misses.
+
+def create_fitness_chart(fitness_data, cache_key=None):
+    def build():
+        import plotly.express as px
+
+        df = _daily_frame(fitness_data, ['duration'])
+        if df is None:
+            return None
+        return px.line(df, x='date', y='duration', title='Exercise Duration Over Time', markers=True)
+    return _cached_figure(('fitness', cache_key) if cache_key else None, build)
+
+def create_nutrition_chart(nutrition_data, cache_key=None):
+    def build():
+        import plotly.express as px
+
+        df = _daily_frame(nutrition_data, ['calories'])
+        if df is None:
+            return None
+        return px.bar(df, x='date', y='calories', title='Daily Calorie Intake')
+    return _cached_figure(('nutrition', cache_key) if cache_key else None, build)
+
+def create_macronutrient_chart(nutrition_data, cache_key=None):
+    def build():
+        import plotly.express as px
+
+        df = _daily_frame(nutrition_data, ['protein', 'carbs', 'fats'])
+        if df is None:
+            return None
+        return px.line(df, x='date', y=['protein', 'carbs', 'fats'],
+                       title='Macronutrient Intake Over Time',
+                       labels={'value': 'Grams', 'variable': 'Macronutrient'},
+                       markers=True)
+    return _cached_figure(('macros', cache_key) if cache_key else None, build)
+
+def create_trend_chart(trend_data, column, title, label, cache_key=None):
+    # Monthly or yearly totals from analytics.py, one bar per period
+    def build():
+        import pandas as pd
+        import plotly.express as px
+
+        data = trend_data() if callable(trend_data) else trend_data
+        df = pd.DataFrame(data)
+        if df.empty:
+            return None
+        return px.bar(df, x='period', y=column, title=title, labels={'period': '', column: label})
+    return _cached_figure(('trend', column, cache_key) if cache_key else None, build)